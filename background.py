@@ -0,0 +1,126 @@
+import queue
+import threading
+
+from incremental import IncrementalCompiler
+from parser import Parser
+from sinks import MemorySink
+from stats import format_stats, timed
+
+# Compiles off the GUI thread. Each submit() supersedes the previous job:
+# the worker checks between lines (or chunks) whether a newer job arrived
+# and abandons the old one. Results are queued for the GUI thread to pick
+# up with poll(), which it calls from Tk's after() loop; the worker never
+# touches Tk itself.
+
+CHECK_EVERY = 256  # lines parsed between cancellation checks
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CompileOutput:
+    __slots__ = ('token_rows', 'symbol_rows', 'code', 'text', 'summary')
+
+    def __init__(self, token_rows, symbol_rows, code, text, summary):
+        self.token_rows = token_rows
+        self.symbol_rows = symbol_rows
+        self.code = code
+        self.text = text
+        self.summary = summary
+
+
+class CompileWorker:
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.parser = Parser()
+        self.incremental = IncrementalCompiler()
+        self.thread = threading.Thread(target=self.run, name="compile-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, source, incremental=True):
+        self.generation += 1
+        self.jobs.put((self.generation, source, incremental))
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def close(self):
+        self.cancel()
+        self.jobs.put(None)
+
+    def poll(self):
+        # (job, output, error) of the newest finished job, or None
+        latest = None
+        while True:
+            try:
+                latest = self.results.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None and latest[0] != self.generation:
+            return None
+        return latest
+
+    def check(self, job):
+        if job != self.generation:
+            raise Cancelled()
+
+    def checked(self, lines, job):
+        for count, item in enumerate(lines):
+            if not count % CHECK_EVERY:
+                self.check(job)
+            yield item
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            # Only the newest queued job matters
+            while job is not None and not self.jobs.empty():
+                job = self.jobs.get()
+            if job is None:
+                return
+            number = job[0]
+            if number != self.generation:
+                continue
+            try:
+                output = self.compile(*job)
+            except Cancelled:
+                continue
+            except Exception as e:
+                # SyntaxError for bad input; anything else is reported too
+                # rather than killing the worker
+                self.results.put((number, None, e))
+                continue
+            self.results.put((number, output, None))
+
+    def compile(self, job, source, incremental):
+        if incremental:
+            result = self.incremental.compile(source, lambda: self.check(job))
+            tokens = result.tokens
+            symbol_table = result.symbol_table
+            code = result.intermediate_code
+            stats = result.stats
+            summary = f"{result.compiled} chunks recompiled, {result.reused} reused"
+        else:
+            parser = self.parser
+            parser.reset()
+            tokens = []
+            parser.parse_lines(self.checked(parser.lexer.iter_lines(source), job), tokens)
+            parser.validate_main()
+            symbol_table = parser.symbol_table
+            code = parser.intermediate_code
+            stats = parser.stats()
+            summary = "Full compile"
+
+        self.check(job)
+        token_rows = [(token.line, token.kind, token.value) for token in tokens]
+        symbol_rows = [(symbol.name, symbol.kind, symbol.type, symbol.scope, symbol.line, symbol.uses)
+                       for symbol in symbol_table]
+        sink = MemorySink()
+        with timed(stats['seconds'], 'write'):
+            sink.write(code)
+            text = sink.text()
+        return CompileOutput(token_rows, symbol_rows, sink.code, text, f"{summary}\n{format_stats(stats)}")
@@ -0,0 +1,426 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from lexer import Lexer
+from optimizer import optimize
+from parser import Parser
+from vm import VM, link
+
+# Scaling benchmarks for the front end on synthetic programs:
+#   python benchmark.py run --sizes 1000,10000,100000 --save baseline.json
+#   python benchmark.py run --baseline baseline.json --threshold 0.25
+#   python benchmark.py generate 100000 -o big.c
+#   python benchmark.py lexers --sizes 10000,100000
+#   python benchmark.py startup --repeat 20
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Run in a fresh interpreter: seconds from the first line to the first token
+STARTUP_PROBE = '''
+import time
+start = time.perf_counter()
+from parser import Parser
+next(Parser().lexer.iter_tokens('int main() {'))
+print(time.perf_counter() - start)
+'''
+COMPARISONS = ('<', '>', '<=', '>=', '==', '!=')
+
+
+class ProgramGenerator:
+    # Emits programs in the subset the parser accepts: one statement per
+    # line, blocks opened with `{` at the end of the line and closed with a
+    # lone `}`. Loops always terminate and divisors are non-zero constants,
+    # so the output can also be executed.
+
+    def __init__(self, seed=0, max_depth=3, expression_depth=4):
+        self.random = random.Random(seed)
+        self.max_depth = max_depth
+        self.expression_depth = expression_depth
+        self.lines = []
+        self.counter = 0
+
+    def fresh(self, prefix):
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def emit(self, depth, text):
+        self.lines.append('    ' * depth + text)
+
+    def operand(self, names):
+        if names and self.random.random() < 0.7:
+            return self.random.choice(names)
+        return str(self.random.randint(0, 99))
+
+    def expression(self, names, depth=None):
+        rand = self.random
+        depth = self.expression_depth if depth is None else depth
+        if depth <= 0 or rand.random() < 0.25:
+            return self.operand(names)
+        left = self.expression(names, depth - 1)
+        if rand.random() < 0.15:
+            return f"{left} {rand.choice(('/', '%'))} {rand.randint(1, 9)}"
+        expr = f"{left} {rand.choice(('+', '-', '*', '+'))} {self.expression(names, depth - 1)}"
+        return f"({expr})" if rand.random() < 0.3 else expr
+
+    def condition(self, names):
+        return f"{self.expression(names, 2)} {self.random.choice(COMPARISONS)} {self.expression(names, 1)}"
+
+    def block(self, depth, readable, assignable, budget):
+        # Writes statements until roughly `budget` lines have been emitted
+        rand = self.random
+        readable = list(readable)
+        assignable = list(assignable)
+        end = len(self.lines) + budget
+        while len(self.lines) < end:
+            choice = rand.random()
+            remaining = end - len(self.lines)
+            if depth < self.max_depth and remaining > 6 and choice < 0.25:
+                self.compound(depth, readable, assignable, min(remaining - 2, rand.randint(4, 20)))
+            elif choice < 0.35:
+                name = self.fresh('v')
+                self.emit(depth, f"int {name} = {self.expression(readable)};")
+                readable.append(name)
+                assignable.append(name)
+            elif choice < 0.97 or not assignable:
+                if not assignable:
+                    continue
+                target = rand.choice(assignable)
+                self.emit(depth, f"{target} = ({self.expression(readable)}) % 1000;")
+            else:
+                self.emit(depth, f"print(\"value\", {rand.choice(readable)});")
+
+    def compound(self, depth, readable, assignable, budget):
+        rand = self.random
+        kind = rand.choice(('if', 'ifelse', 'while', 'for'))
+        inner = max(1, budget - 3)
+        if kind in ('if', 'ifelse'):
+            self.emit(depth, f"if ({self.condition(readable)}) {{")
+            if kind == 'ifelse':
+                self.block(depth + 1, readable, assignable, max(1, inner // 2))
+                self.emit(depth, "}")
+                self.emit(depth, "else {")
+                self.block(depth + 1, readable, assignable, max(1, inner // 2))
+            else:
+                self.block(depth + 1, readable, assignable, inner)
+        elif kind == 'while':
+            # The counter is readable but never assigned by generated statements
+            counter = self.fresh('c')
+            self.emit(depth, f"int {counter} = {rand.randint(1, 4)};")
+            readable.append(counter)
+            self.emit(depth, f"while ({counter} > 0) {{")
+            self.emit(depth + 1, f"{counter} = {counter} - 1;")
+            self.block(depth + 1, readable, assignable, max(1, inner - 1))
+        else:
+            index = self.fresh('i')
+            self.emit(depth, f"for (int {index} = 0; {index} < {rand.randint(1, 4)}; {index}++) {{")
+            self.block(depth + 1, readable + [index], assignable, inner)
+        self.emit(depth, "}")
+
+    def function(self, name, budget):
+        self.emit(0, f"int {name}(int a, int b) {{")
+        self.block(1, ['a', 'b'], ['a', 'b'], max(1, budget - 3))
+        self.emit(1, f"return {self.expression(['a', 'b'], 2)};")
+        self.emit(0, "}")
+        self.emit(0, "")
+
+    def program(self, lines):
+        rand = self.random
+        helpers = []
+        bodies = []
+        total = 0
+        # Helpers are generated first so main knows how many to call
+        while total + len(helpers) + 6 < lines:
+            name = self.fresh('f')
+            helpers.append(name)
+            self.lines = []
+            self.function(name, rand.randint(40, 200))
+            bodies.append(self.lines)
+            total += len(self.lines)
+
+        self.lines = ["#include<stdio.h>", "", "int main() {", "    int s = 1;"]
+        for name in helpers:
+            self.emit(1, f"s = (s + {name}(s, {rand.randint(0, 9)})) % 1000;")
+        self.emit(1, "print(\"result\", s);")
+        self.emit(1, "return 0;")
+        self.emit(0, "}")
+        self.emit(0, "")
+        for body in bodies:
+            self.lines.extend(body)
+        return '\n'.join(self.lines) + '\n'
+
+
+def generate_program(lines, seed=0):
+    return ProgramGenerator(seed).program(lines)
+
+
+def measure(run, repeat=1, memory=True):
+    # Best wall time over `repeat` runs, then one traced run for peak memory
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def benchmark_size(lines, seed=0, repeat=1, memory=True):
+    source = generate_program(lines, seed)
+    line_count = source.count('\n')
+    lexer = Lexer()
+
+    def lex():
+        return list(lexer.iter_lines(source))
+
+    token_lines, lex_time, lex_peak = measure(lex, repeat, memory)
+    token_count = sum(len(tokens) for _, tokens in token_lines)
+
+    def parse():
+        parser = Parser()
+        parser.parse_lines(token_lines)
+        parser.validate_main()
+        return parser
+
+    parser, parse_time, parse_peak = measure(parse, repeat, memory)
+    code = parser.intermediate_code
+    # Expression lowering happens during parsing; the parser times it separately
+    ir_time = parser.stats()['seconds']['ir']
+    parse_time -= ir_time
+
+    (optimized, report), optimize_time, optimize_peak = measure(lambda: optimize(code), repeat, memory)
+
+    def write():
+        return '\n'.join(code.lines())
+
+    text, write_time, write_peak = measure(write, repeat, memory)
+
+    program = link(code)
+
+    def execute():
+        vm = VM(program, io.StringIO())
+        vm.run()
+        return vm.steps
+
+    steps, execute_time, execute_peak = measure(execute, repeat, memory)
+
+    def phase(seconds, peak, **rates):
+        entry = {'seconds': round(seconds, 6)}
+        for name, amount in rates.items():
+            entry[name] = round(amount / seconds, 1) if seconds else None
+        if peak is not None:
+            entry['peak_kib'] = round(peak / 1024, 1)
+        return entry
+
+    return {
+        'lines': line_count,
+        'tokens': token_count,
+        'ir_instructions': len(code),
+        'ir_bytes': len(text),
+        'optimized_instructions': report.after,
+        'phases': {
+            'lex': phase(lex_time, lex_peak, tokens_per_sec=token_count, lines_per_sec=line_count),
+            'parse': phase(parse_time, parse_peak, tokens_per_sec=token_count, lines_per_sec=line_count),
+            'ir': phase(ir_time, None, instructions_per_sec=len(code)),
+            'optimize': phase(optimize_time, optimize_peak, instructions_per_sec=len(code)),
+            'write': phase(write_time, write_peak, instructions_per_sec=len(code)),
+            'execute': phase(execute_time, execute_peak, instructions_per_sec=steps),
+        },
+    }
+
+
+def compare(results, baseline, threshold):
+    # A phase regresses when it is slower, or its peak memory larger, than
+    # the baseline by more than `threshold` (a fraction)
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get('sizes', {}).get(size)
+        if base is None:
+            continue
+        for name, current in result['phases'].items():
+            previous = base['phases'].get(name)
+            if previous is None:
+                continue
+            for metric in ('seconds', 'peak_kib'):
+                old, new = previous.get(metric), current.get(metric)
+                if old and new and new > old * (1 + threshold):
+                    regressions.append(f"{size} lines, {name}: {metric} {old} -> {new} "
+                                       f"(+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_result(size, result):
+    print(f"{result['lines']} lines, {result['tokens']} tokens, {result['ir_instructions']} IR instructions "
+          f"({result['ir_bytes']} bytes, {result['optimized_instructions']} after -O)")
+    for name, entry in result['phases'].items():
+        rates = ', '.join(f"{key} {value:,.0f}" for key, value in entry.items()
+                          if key.endswith('_per_sec') and value is not None)
+        peak = f", peak {entry['peak_kib']:,.0f} KiB" if 'peak_kib' in entry else ""
+        print(f"  {name:<9} {entry['seconds'] * 1000:10.1f} ms  {rates}{peak}")
+
+
+def cmd_run(args):
+    sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else list(DEFAULT_SIZES)
+    results = {}
+    for size in sizes:
+        result = benchmark_size(size, args.seed, args.repeat, not args.no_memory)
+        results[str(size)] = result
+        print_result(size, result)
+
+    if args.save:
+        report = {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'sizes': results,
+        }
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+        print(f"No regressions beyond {args.threshold * 100:.0f}% against {args.baseline}")
+    return 0
+
+
+def compare_lexers(lines, seed=0, repeat=3):
+    # Times every lexer engine on the same program and checks they agree
+    source = generate_program(lines, seed)
+    results = {}
+    reference = None
+    for engine in Lexer.ENGINES:
+        lexer = Lexer(engine)
+        token_lines, seconds, _ = measure(lambda: list(lexer.iter_lines(source)), repeat, memory=False)
+        if reference is None:
+            reference = token_lines
+        elif token_lines != reference:
+            raise AssertionError(f"{engine} lexer output differs from {Lexer.ENGINES[0]}")
+        tokens = sum(len(tokens) for _, tokens in token_lines)
+        results[engine] = {'seconds': round(seconds, 6), 'tokens_per_sec': round(tokens / seconds, 1)}
+    return results
+
+
+def cmd_lexers(args):
+    sizes = [int(size) for size in args.sizes.split(',')]
+    baseline = Lexer.ENGINES[0]
+    for size in sizes:
+        results = compare_lexers(size, args.seed, args.repeat)
+        print(f"{size} lines (outputs identical)")
+        for engine, entry in results.items():
+            speedup = results[baseline]['seconds'] / entry['seconds']
+            print(f"  {engine:<7} {entry['seconds'] * 1000:10.1f} ms  "
+                  f"tokens_per_sec {entry['tokens_per_sec']:,.0f}  x{speedup:.2f}")
+    return 0
+
+
+def run_probe(code, env):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+    return time.perf_counter() - start, output
+
+
+def measure_startup(repeat=10):
+    # Median cold times per lexer setup: (import-to-first-token, whole process)
+    with tempfile.TemporaryDirectory() as directory:
+        tables = os.path.join(directory, 'lexer_tables.marshal')
+        run_probe(f"import table_lexer; table_lexer.save_tables({tables!r})", dict(os.environ))
+        setups = {
+            'regex': {'LEXER_ENGINE': 'regex'},
+            'table (built)': {'LEXER_ENGINE': 'table', 'LEXER_TABLES': os.path.join(directory, 'missing')},
+            'table (saved)': {'LEXER_ENGINE': 'table', 'LEXER_TABLES': tables},
+        }
+        # Bytecode is written by an untimed first run, so the timed runs do
+        # not include compiling the modules
+        base_env = {name: value for name, value in os.environ.items() if name != 'PYTHONDONTWRITEBYTECODE'}
+        baseline = statistics.median(run_probe('pass', base_env)[0] for _ in range(repeat))
+        results = {'interpreter': {'first_token': 0.0, 'process': baseline}}
+        for name, extra in setups.items():
+            env = dict(base_env, **extra)
+            run_probe(STARTUP_PROBE, env)
+            runs = [run_probe(STARTUP_PROBE, env) for _ in range(repeat)]
+            results[name] = {'first_token': statistics.median(float(output) for _, output in runs),
+                             'process': statistics.median(seconds for seconds, _ in runs)}
+    return results
+
+
+def cmd_startup(args):
+    print(f"{'':<15}{'first token':>12}{'process':>10}")
+    for name, entry in measure_startup(args.repeat).items():
+        print(f"{name:<15}{entry['first_token'] * 1000:9.2f} ms{entry['process'] * 1000:7.1f} ms")
+    return 0
+
+
+def cmd_generate(args):
+    source = generate_program(args.lines, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='benchmark', description="Front-end scaling benchmarks.")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    run_cmd = commands.add_parser('run', help="benchmark lexing, parsing, optimization and IR writing")
+    run_cmd.add_argument('--sizes', default=None,
+                         help="comma-separated program sizes in lines (default: 1000,10000,100000)")
+    run_cmd.add_argument('--seed', type=int, default=0)
+    run_cmd.add_argument('--repeat', type=int, default=1, help="timed runs per phase (best is kept)")
+    run_cmd.add_argument('--no-memory', action='store_true', help="skip the traced peak-memory runs")
+    run_cmd.add_argument('--save', metavar='PATH', help="write results as a JSON baseline")
+    run_cmd.add_argument('--baseline', metavar='PATH', help="compare against a saved baseline")
+    run_cmd.add_argument('--threshold', type=float, default=0.25,
+                         help="allowed slowdown/growth before failing (default: 0.25)")
+    run_cmd.set_defaults(func=cmd_run)
+
+    lex_cmd = commands.add_parser('lexers', help="compare the lexer engines")
+    lex_cmd.add_argument('--sizes', default='10000,100000')
+    lex_cmd.add_argument('--seed', type=int, default=0)
+    lex_cmd.add_argument('--repeat', type=int, default=3)
+    lex_cmd.set_defaults(func=cmd_lexers)
+
+    startup_cmd = commands.add_parser('startup', help="time cold import-to-first-token in fresh processes")
+    startup_cmd.add_argument('--repeat', type=int, default=10)
+    startup_cmd.set_defaults(func=cmd_startup)
+
+    gen_cmd = commands.add_parser('generate', help="write a synthetic program")
+    gen_cmd.add_argument('lines', type=int)
+    gen_cmd.add_argument('--seed', type=int, default=0)
+    gen_cmd.add_argument('-o', '--output', default=None)
+    gen_cmd.set_defaults(func=cmd_generate)
+
+    args = arg_parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
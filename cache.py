@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import struct
+import time
+from array import array
+
+from ir import IRBuffer
+from lexer import Token
+from parser import Parser
+from symbols import Symbol
+from units import Chunk, CompiledUnit, compile_unit
+
+# On-disk cache of compiled units, in the spirit of __pycache__. An entry is
+# keyed by the hash of the unit's text and a fingerprint of the compiler
+# sources, so editing the lexer or parser invalidates everything. Entries
+# are written to a temporary file and renamed into place, which keeps
+# concurrent batch workers from ever reading a partial entry. Reading an
+# entry refreshes its mtime; once the directory grows past max_bytes the
+# least recently used entries are removed.
+#
+# An entry is a JSON header followed by raw array bytes, which load without
+# decoding: the tokens as columns of kind, value, line and column, then the
+# four IRBuffer arrays. Callers that only need the IR (batch builds) skip the
+# token columns. Entries are never unpickled: a checked-out tree can ship
+# its own .ircache/, and the keys are computed from public data.
+
+DEFAULT_DIR = '.ircache'
+DEFAULT_MAX_BYTES = 64 << 20
+FORMAT = 3
+MAGIC = b'IRCU'
+HEADER = struct.Struct('<4sI')  # magic, JSON header size
+SUFFIX = '.unit'
+# Modules whose code decides the tokens, symbols or IR of a unit
+COMPILER_MODULES = ('lexer.py', 'table_lexer.py', 'parser.py', 'expression.py', 'symbols.py', 'ir.py', 'units.py')
+
+fingerprint_cache = None
+
+
+def compiler_fingerprint():
+    global fingerprint_cache
+    if fingerprint_cache is None:
+        digest = hashlib.blake2b(str(FORMAT).encode(), digest_size=16)
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in COMPILER_MODULES:
+            with open(os.path.join(here, name), 'rb') as f:
+                digest.update(f.read())
+        fingerprint_cache = digest.digest()
+    return fingerprint_cache
+
+
+def dump_unit(unit, stats):
+    code = unit.code
+    tokens = unit.tokens
+    # Token kinds and values repeat a lot: each distinct string is stored
+    # once and the tokens refer to it by index
+    kinds = {}
+    values = {}
+    sections = [
+        array('i', [kinds.setdefault(token.kind, len(kinds)) for token in tokens]).tobytes(),
+        array('i', [values.setdefault(token.value, len(values)) for token in tokens]).tobytes(),
+        array('i', [token.line for token in tokens]).tobytes(),
+        array('i', [token.column for token in tokens]).tobytes(),
+        code.ops.tobytes(),
+        code.arg1.tobytes(),
+        code.arg2.tobytes(),
+        code.result.tobytes(),
+    ]
+    header = json.dumps({
+        'format': FORMAT,
+        'start_line': unit.start_line,
+        'symbols': [(s.name, s.kind, s.type, s.scope, s.line, s.uses, s.ir_name) for s in unit.symbols],
+        'forward': unit.forward,
+        'operands': code.operands,
+        'extra': list(code.extra.items()),
+        'temps': unit.temps,
+        'labels': unit.labels,
+        'main_found': unit.main_found,
+        'stats': stats,
+        'kinds': list(kinds),
+        'values': list(values),
+        'sections': [len(section) for section in sections],
+    }).encode()
+    return b''.join([HEADER.pack(MAGIC, len(header)), header] + sections)
+
+
+def load_unit(data, with_tokens=True):
+    # Without tokens the unit's token list is left empty
+    magic, size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a cache entry")
+    pos = HEADER.size + size
+    header = json.loads(data[HEADER.size:pos])
+    if header['format'] != FORMAT:
+        raise ValueError(f"cache format {header['format']}")
+    sections = []
+    for length in header['sections']:
+        sections.append(data[pos:pos + length])
+        pos += length
+    if pos != len(data) or len(sections) != 8:
+        raise ValueError("truncated cache entry")
+    kinds, values, lines, columns, ops, arg1, arg2, result = sections
+
+    tokens = []
+    if with_tokens:
+        kind_names = header['kinds']
+        value_names = header['values']
+        tokens = list(map(Token, map(kind_names.__getitem__, array('i', kinds)),
+                          map(value_names.__getitem__, array('i', values)), array('i', lines), array('i', columns)))
+
+    code = IRBuffer()
+    code.operands = header['operands']
+    code.operand_ids = {value: index for index, value in enumerate(code.operands)}
+    code.extra = {index: tuple(args) for index, args in header['extra']}
+    code.ops.frombytes(ops)
+    code.arg1.frombytes(arg1)
+    code.arg2.frombytes(arg2)
+    code.result.frombytes(result)
+    if not len(code.ops) == len(code.arg1) == len(code.arg2) == len(code.result):
+        raise ValueError("corrupt cache entry")
+    symbols = [Symbol(*symbol) for symbol in header['symbols']]
+    return CompiledUnit(header['start_line'], tokens, symbols, header['forward'], code,
+                        header['temps'], header['labels'], header['main_found']), header['stats']
+
+
+class CompileCache:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None  # bytes in the directory, measured on first write
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, chunk):
+        key = hashlib.blake2b(compiler_fingerprint() + chunk.key, digest_size=20).hexdigest()
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, chunk, with_tokens=True):
+        # (CompiledUnit, stats) or None; unreadable entries count as misses
+        if self.size is None:
+            # A lowered limit takes effect even on runs that only read
+            self.size = self.disk_usage()
+            if self.size > self.max_bytes:
+                self.evict()
+        path = self.path(chunk)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            result = load_unit(data, with_tokens)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self.discard(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, chunk, unit, stats):
+        import tempfile  # slow to import and only needed on a miss
+        data = dump_unit(unit, stats)
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self.path(chunk))
+        except BaseException:
+            self.discard(temp_path)
+            raise
+        if self.size is None:
+            self.size = self.disk_usage()
+        else:
+            self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def compile(self, chunk, parser=None, with_tokens=True, jobs=1):
+        # Returns (CompiledUnit, stats, hit); jobs > 1 compiles a whole-file
+        # chunk function by function in worker processes
+        start = time.perf_counter()
+        cached = self.get(chunk, with_tokens)
+        if cached is not None:
+            self.hits += 1
+            unit, stats = cached
+            stats = dict(stats, seconds={'cache': time.perf_counter() - start})
+            return unit, stats, True
+        self.misses += 1
+        if jobs > 1 and chunk.start_line == 1:
+            from parallel import compile_parallel  # parallel imports this module
+            unit, _, stats = compile_parallel(chunk.text, jobs)
+        else:
+            parser = parser or Parser()
+            unit = compile_unit(chunk, parser)
+            stats = parser.stats()
+        try:
+            self.put(chunk, unit, stats)
+        except OSError:
+            pass  # a read-only or full disk only costs the cache
+        return unit, stats, False
+
+    def compile_source(self, source, parser=None, with_tokens=True, jobs=1):
+        return self.compile(Chunk(1, [source], False), parser, with_tokens, jobs)
+
+    def entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        # Oldest entries go first until the cache is back under 90% of its limit
+        entries = sorted(self.entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            self.discard(path)
+            size -= entry_size
+        self.size = size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self.discard(path)
+        self.size = 0
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
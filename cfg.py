@@ -0,0 +1,219 @@
+import heapq
+
+from ir import Instr, from_instrs, is_temp
+from optimizer import split_functions
+
+# Control-flow graph of one function's instructions. Blocks start at the
+# function entry, at every label and after every jump or return; their ids
+# are dense (0..n-1, in instruction order) so per-block data lives in lists.
+#
+# Liveness is computed for temps only, as bitsets (Python ints) indexed by a
+# dense temp number. allocate_temps() then turns every temp into a live
+# interval over instruction positions and renames temps with a linear scan,
+# handing out the lowest free number, so temps whose lifetimes do not overlap
+# share a name (t1, t2, ... per function).
+
+JUMPS = frozenset(('goto', 'if', 'ifnot'))
+BLOCK_END = JUMPS | {'return'}
+
+
+class BasicBlock:
+    __slots__ = ('id', 'start', 'end', 'successors', 'predecessors')
+
+    def __init__(self, id, start, end):
+        self.id = id
+        self.start = start   # index of the first instruction
+        self.end = end       # index of the last instruction
+        self.successors = []
+        self.predecessors = []
+
+    def __repr__(self):
+        return f"BasicBlock({self.id}, {self.start}..{self.end}, -> {self.successors})"
+
+
+class CFG:
+    def __init__(self, instrs):
+        self.instrs = instrs
+        self.blocks = []
+        self.label_block = {}  # label -> block id
+        self.build()
+
+    def build(self):
+        instrs = self.instrs
+        starts = []
+        new_block = True
+        for index, instr in enumerate(instrs):
+            if new_block or instr.op == 'label':
+                if not starts or starts[-1] != index:
+                    starts.append(index)
+            new_block = instr.op in BLOCK_END
+            if instr.op == 'label':
+                self.label_block[instr.result] = len(starts) - 1
+
+        blocks = self.blocks
+        for number, start in enumerate(starts):
+            end = starts[number + 1] - 1 if number + 1 < len(starts) else len(instrs) - 1
+            blocks.append(BasicBlock(number, start, end))
+
+        for block in blocks:
+            last = instrs[block.end]
+            if last.op in JUMPS:
+                target = self.label_block.get(last.result)
+                if target is not None:
+                    block.successors.append(target)
+            if last.op not in ('goto', 'return') and block.id + 1 < len(blocks):
+                if block.id + 1 not in block.successors:
+                    block.successors.append(block.id + 1)
+            for successor in block.successors:
+                blocks[successor].predecessors.append(block.id)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+
+def temp_numbers(instrs):
+    numbers = {}
+    for instr in instrs:
+        for name in (*instr.uses(), instr.defines()):
+            if is_temp(name) and name not in numbers:
+                numbers[name] = len(numbers)
+    return numbers
+
+
+def liveness(cfg, numbers):
+    # Returns (live_in, live_out) bitsets per block id
+    instrs = cfg.instrs
+    count = len(cfg.blocks)
+    uses = [0] * count
+    defs = [0] * count
+    for block in cfg.blocks:
+        used = defined = 0
+        for index in range(block.start, block.end + 1):
+            instr = instrs[index]
+            for name in instr.uses():
+                bit = numbers.get(name)
+                if bit is not None and not defined >> bit & 1:
+                    used |= 1 << bit
+            bit = numbers.get(instr.defines())
+            if bit is not None:
+                defined |= 1 << bit
+        uses[block.id] = used
+        defs[block.id] = defined
+
+    live_in = [0] * count
+    live_out = [0] * count
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(cfg.blocks):
+            out = 0
+            for successor in block.successors:
+                out |= live_in[successor]
+            entry = uses[block.id] | (out & ~defs[block.id])
+            if out != live_out[block.id] or entry != live_in[block.id]:
+                live_out[block.id] = out
+                live_in[block.id] = entry
+                changed = True
+    return live_in, live_out
+
+
+def bits(value):
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+
+def live_intervals(instrs, cfg=None, numbers=None):
+    # temp number -> [first, last] instruction position where it is live
+    cfg = cfg or CFG(instrs)
+    numbers = numbers if numbers is not None else temp_numbers(instrs)
+    intervals = {}
+
+    def cover(number, position):
+        interval = intervals.get(number)
+        if interval is None:
+            intervals[number] = [position, position]
+        elif position < interval[0]:
+            interval[0] = position
+        elif position > interval[1]:
+            interval[1] = position
+
+    for position, instr in enumerate(instrs):
+        for name in (*instr.uses(), instr.defines()):
+            number = numbers.get(name)
+            if number is not None:
+                cover(number, position)
+
+    live_in, live_out = liveness(cfg, numbers)
+    for block in cfg.blocks:
+        for number in bits(live_in[block.id]):
+            cover(number, block.start)
+        for number in bits(live_out[block.id]):
+            cover(number, block.end)
+    return intervals
+
+
+def allocate_function(instrs):
+    # Returns (renamed instructions, temps before, temps after)
+    numbers = temp_numbers(instrs)
+    if not numbers:
+        return instrs, 0, 0
+    intervals = live_intervals(instrs, numbers=numbers)
+    names = {number: name for name, number in numbers.items()}
+
+    free = []      # heap of released slot numbers
+    active = []    # heap of (end, slot) for intervals still live
+    slots = 0
+    renamed = {}
+    for number, (start, end) in sorted(intervals.items(), key=lambda item: (item[1][0], item[0])):
+        # An operand read at `start` is dead after it, so its slot can be
+        # written by the instruction at `start`
+        while active and active[0][0] <= start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            slot = heapq.heappop(free)
+        else:
+            slots += 1
+            slot = slots
+        heapq.heappush(active, (end, slot))
+        renamed[names[number]] = f"t{slot}"
+
+    out = []
+    for instr in instrs:
+        arg1 = renamed.get(instr.arg1, instr.arg1)
+        arg2 = renamed.get(instr.arg2, instr.arg2)
+        result = renamed.get(instr.result, instr.result) if instr.defines() is not None else instr.result
+        args = tuple(renamed.get(a, a) for a in instr.args) if instr.op in ('call', 'print') else instr.args
+        if (arg1, arg2, result, args) != (instr.arg1, instr.arg2, instr.result, instr.args):
+            instr = Instr(instr.op, arg1, arg2, result, args)
+        out.append(instr)
+    return out, len(numbers), slots
+
+
+class AllocationReport:
+    __slots__ = ('before', 'after', 'max_slots')
+
+    def __init__(self):
+        self.before = 0     # distinct temps in the input
+        self.after = 0      # sum over functions of the temps kept
+        self.max_slots = 0  # largest per-function temp count after allocation
+
+    def __str__(self):
+        return f"{self.before} temps -> {self.after} ({self.max_slots} max per function)"
+
+
+def allocate_temps(code):
+    # Renames the temps of every function; returns (IRBuffer, report)
+    report = AllocationReport()
+    out = []
+    for function in split_functions(list(code)):
+        instrs, before, after = allocate_function(function)
+        report.before += before
+        report.after += after
+        report.max_slots = max(report.max_slots, after)
+        out.extend(instrs)
+    return from_instrs(out), report
@@ -0,0 +1,315 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import namedtuple
+from functools import partial
+
+from cache import DEFAULT_DIR, DEFAULT_MAX_BYTES, CompileCache
+from cfg import allocate_temps
+from optimizer import optimize
+from parallel import compile_source as compile_functions
+from parser import Parser
+from sinks import BinarySink, FileSink, load_ir, open_sink, write_text
+from stats import add_stats, format_stats, new_stats, timed
+from vm import VM, VMError, link
+
+# Headless front end, usable without a display:
+#   python -m compiler build src/**/*.c -j 8
+
+FileResult = namedtuple('FileResult', 'path output error lines emitted instructions seconds stats')
+
+caches = {}  # (directory, max_bytes) -> CompileCache, one per process
+
+
+def get_cache(directory, max_bytes=DEFAULT_MAX_BYTES):
+    cache = caches.get((directory, max_bytes))
+    if cache is None:
+        cache = caches[directory, max_bytes] = CompileCache(directory, max_bytes)
+    return cache
+
+
+def compile_source(source):
+    parser = Parser()
+    parser.parse_source(source)
+    parser.validate_main()
+    return parser
+
+
+def output_path(path, out_dir=None, binary=False):
+    base = os.path.splitext(path)[0] + ('.irb' if binary else '.ir')
+    if out_dir is None:
+        return base
+    rel = os.path.relpath(base)
+    if rel.startswith(os.pardir):
+        rel = os.path.basename(base)
+    return os.path.join(out_dir, rel)
+
+
+def output_collisions(paths, out_dir=None, binary=False):
+    # {output: [inputs]} for outputs that more than one input would write,
+    # e.g. ../a/x.c and ../b/x.c both become DIR/x.ir under -o DIR
+    writers = {}
+    for path in paths:
+        out_path = output_path(path, out_dir, binary)
+        writers.setdefault(os.path.normcase(os.path.abspath(out_path)), (out_path, []))[1].append(path)
+    return {out_path: inputs for out_path, inputs in writers.values() if len(inputs) > 1}
+
+
+def compile_file(path, out_dir=None, optimize_ir=False, binary=False, reuse_temps=False,
+                 cache_dir=None, cache_size=DEFAULT_MAX_BYTES, function_jobs=1):
+    # function_jobs > 1 splits a large file at function boundaries and
+    # compiles the functions in that many worker processes
+    start = time.perf_counter()
+    lines = 0
+    try:
+        with open(path) as f:
+            source = f.read()
+        lines = source.count('\n') + 1
+        if cache_dir is None and function_jobs > 1:
+            code, stats = compile_functions(source, function_jobs)
+        elif cache_dir is None:
+            parser = compile_source(source)
+            code = parser.intermediate_code
+            stats = parser.stats()
+        else:
+            # Tokens, symbols and IR of unchanged sources come from the cache
+            unit, stats, _ = get_cache(cache_dir, cache_size).compile_source(
+                source, with_tokens=False, jobs=function_jobs)
+            if not unit.main_found:
+                raise SyntaxError("Program must start with a 'main' function.")
+            code = unit.code
+        seconds = stats['seconds']
+        emitted = len(code)
+        if optimize_ir:
+            with timed(seconds, 'optimize'):
+                code, _ = optimize(code)
+        if reuse_temps:
+            with timed(seconds, 'allocate'):
+                code, _ = allocate_temps(code)
+        out_path = output_path(path, out_dir, binary)
+        out_parent = os.path.dirname(out_path)
+        if out_parent:
+            os.makedirs(out_parent, exist_ok=True)
+        with timed(seconds, 'write'), (BinarySink(out_path) if binary else FileSink(out_path)) as sink:
+            sink.write(code)
+    except SyntaxError as e:
+        return FileResult(path, None, str(e), lines, 0, 0, time.perf_counter() - start, None)
+    except OSError as e:
+        return FileResult(path, None, f"I/O error: {e}", lines, 0, 0, time.perf_counter() - start, None)
+    except Exception as e:
+        return FileResult(path, None, f"internal error: {e!r}", lines, 0, 0, time.perf_counter() - start, None)
+    return FileResult(path, out_path, None, lines, emitted, len(code), time.perf_counter() - start, stats)
+
+
+def expand_inputs(patterns):
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def build(paths, jobs=None, **options):
+    # options are passed on to compile_file
+    jobs = jobs or os.cpu_count() or 1
+    if len(paths) == 1:
+        # One file cannot be spread over processes; its functions can
+        yield compile_file(paths[0], function_jobs=jobs, **options)
+        return
+    compile_one = partial(compile_file, **options)
+    if jobs == 1:
+        for path in paths:
+            yield compile_one(path)
+        return
+    # Imported here: it costs more than compiling a small file
+    from concurrent.futures import ProcessPoolExecutor
+    # Large chunks keep IPC overhead low; several per worker keep the tail short
+    chunksize = max(1, len(paths) // (jobs * 8))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(compile_one, paths, chunksize=chunksize)
+
+
+def cmd_build(args):
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("No input files.", file=sys.stderr)
+        return 2
+    collisions = output_collisions(paths, args.out_dir, args.binary)
+    if collisions:
+        # Workers would overwrite each other's output in no particular order
+        for out_path, inputs in collisions.items():
+            print(f"{out_path} would be written by {', '.join(inputs)}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    failed = 0
+    total_lines = 0
+    total_emitted = 0
+    total_instructions = 0
+    stats = new_stats()
+    cached = 0
+    results = build(paths, args.jobs, out_dir=args.out_dir, optimize_ir=args.optimize, binary=args.binary,
+                    reuse_temps=args.reuse_temps, cache_dir=None if args.no_cache else args.cache_dir,
+                    cache_size=args.cache_size << 20)
+    for result in results:
+        total_lines += result.lines
+        if result.error:
+            failed += 1
+            print(f"{result.path}: {result.error}", file=sys.stderr)
+            continue
+        total_emitted += result.emitted
+        total_instructions += result.instructions
+        add_stats(stats, result.stats)
+        cached += 'cache' in result.stats['seconds']
+        if args.verbose:
+            sizes = (f"{result.emitted} -> {result.instructions}" if args.optimize
+                     else f"{result.instructions}")
+            print(f"{result.path} -> {result.output} "
+                  f"({sizes} instructions, {result.seconds * 1000:.1f} ms)")
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    print(f"Compiled {len(paths) - failed}/{len(paths)} files in {elapsed:.2f} s "
+          f"({len(paths) / elapsed:.1f} files/s, {total_lines / elapsed:.0f} lines/s, "
+          f"{total_instructions} instructions)")
+    if args.optimize:
+        print(f"Optimized {total_emitted} -> {total_instructions} instructions")
+    if cached:
+        print(f"{cached} files reused from {args.cache_dir}")
+    if args.stats:
+        print(format_stats(stats))
+    return 1 if failed else 0
+
+
+def cmd_stream(args):
+    # Constant-memory compile of one (possibly huge) file: IR is written out
+    # function by function while the source is still being read. Binary
+    # output gets one block per function, which decodes to the same IR as
+    # the single block 'build -b' writes
+    if args.binary and args.output == '-':
+        print("binary IR needs an output path (-o)", file=sys.stderr)
+        return 2
+    parser = Parser()
+
+    def transform(code):
+        # parse_stream() resets the timings, so look them up on each call
+        if args.optimize:
+            with timed(parser.timings, 'optimize'):
+                code, _ = optimize(code)
+        if args.reuse_temps:
+            with timed(parser.timings, 'allocate'):
+                code, _ = allocate_temps(code)
+        return code
+
+    try:
+        source = sys.stdin if args.input == '-' else open(args.input)
+        with source, open_sink(args.output, args.binary or None) as sink:
+            parser.parse_stream(source, sink, transform if args.optimize or args.reuse_temps else None)
+            parser.validate_main()
+    except (SyntaxError, OSError) as e:
+        # Functions before the error have already been written
+        print(f"{args.input}: {e}", file=sys.stderr)
+        return 1
+    if args.stats:
+        print(format_stats(parser.stats()), file=sys.stderr)
+    return 0
+
+
+def cmd_dump(args):
+    # Prints binary IR files in the text format
+    for path in args.inputs:
+        try:
+            code = load_ir(path)
+        except (OSError, ValueError) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            return 1
+        write_text(sys.stdout, code)
+    return 0
+
+
+def cmd_run(args):
+    # Compiles (or loads binary IR) and executes main on the IR interpreter
+    try:
+        if args.input.endswith('.irb'):
+            code = load_ir(args.input)
+        else:
+            with open(args.input) as f:
+                code = compile_source(f.read()).intermediate_code
+        if args.optimize:
+            code, _ = optimize(code)
+        if args.reuse_temps:
+            code, _ = allocate_temps(code)
+        vm = VM(link(code), max_steps=args.max_steps, max_depth=args.max_depth, profile=args.profile)
+        value = vm.run()
+    except (SyntaxError, VMError, ValueError, OSError) as e:
+        print(f"{args.input}: {e}", file=sys.stderr)
+        return 2
+    finally:
+        sys.stdout.flush()
+    if args.profile:
+        print(vm.profile.report(vm.program), file=sys.stderr)
+    return value & 0xff if isinstance(value, int) else 0
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='compiler', description="Headless C front end.")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    build_cmd = commands.add_parser('build', help="compile C files to intermediate code")
+    build_cmd.add_argument('inputs', nargs='+', help="source files or glob patterns (** supported)")
+    build_cmd.add_argument('-j', '--jobs', type=int, default=None,
+                           help="worker processes (default: number of CPUs)")
+    build_cmd.add_argument('-o', '--out-dir', default=None,
+                           help="directory for .ir files (default: next to each source)")
+    build_cmd.add_argument('-O', '--optimize', action='store_true',
+                           help="run the IR optimization passes before writing")
+    build_cmd.add_argument('-R', '--reuse-temps', action='store_true',
+                           help="rename temps so ones with disjoint lifetimes share a name")
+    build_cmd.add_argument('-b', '--binary', action='store_true',
+                           help="write compact binary IR (.irb) instead of text")
+    build_cmd.add_argument('--cache-dir', default=DEFAULT_DIR,
+                           help=f"cache of compiled sources (default: {DEFAULT_DIR})")
+    build_cmd.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES >> 20, metavar='MB',
+                           help="evict least recently used entries beyond this size")
+    build_cmd.add_argument('--no-cache', action='store_true', help="always compile from scratch")
+    build_cmd.add_argument('-v', '--verbose', action='store_true', help="report every file")
+    build_cmd.add_argument('--stats', action='store_true',
+                           help="print counters and per-phase times summed over all files")
+    build_cmd.set_defaults(func=cmd_build)
+
+    stream_cmd = commands.add_parser('stream', help="compile one file in constant memory, function by function")
+    stream_cmd.add_argument('input', help="source file, or - for stdin")
+    stream_cmd.add_argument('-o', '--output', default='-', help="IR file (.irb for binary), or - for stdout")
+    stream_cmd.add_argument('-b', '--binary', action='store_true', help="write binary IR")
+    stream_cmd.add_argument('-O', '--optimize', action='store_true', help="optimize each function's IR")
+    stream_cmd.add_argument('-R', '--reuse-temps', action='store_true', help="reuse temp slots in each function")
+    stream_cmd.add_argument('--stats', action='store_true', help="print counters and phase times on stderr")
+    stream_cmd.set_defaults(func=cmd_stream)
+
+    dump_cmd = commands.add_parser('dump', help="print binary IR (.irb) files as text")
+    dump_cmd.add_argument('inputs', nargs='+')
+    dump_cmd.set_defaults(func=cmd_dump)
+
+    run_cmd = commands.add_parser('run', help="execute a program (.c or .irb) on the IR interpreter")
+    run_cmd.add_argument('input')
+    run_cmd.add_argument('-O', '--optimize', action='store_true', help="optimize the IR first")
+    run_cmd.add_argument('-R', '--reuse-temps', action='store_true', help="reuse temp slots first")
+    run_cmd.add_argument('--profile', action='store_true',
+                         help="report instruction counts and per-function times on stderr")
+    run_cmd.add_argument('--max-steps', type=int, default=None,
+                         help="abort after this many executed instructions")
+    run_cmd.add_argument('--max-depth', type=int, default=None,
+                         help="abort beyond this many nested calls (default: no limit)")
+    run_cmd.set_defaults(func=cmd_run)
+
+    args = arg_parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
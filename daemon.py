@@ -0,0 +1,384 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from cfg import allocate_temps
+from optimizer import optimize
+from parser import Parser
+from stats import timed
+
+# Local compile server for editors and CI. One long-running process keeps
+# warm parsers (modules imported, lexer regex compiled) and answers requests
+# over a Unix socket or a localhost TCP port:
+#   python daemon.py serve [--socket PATH | --port N] [--workers N]
+#   python daemon.py compile file.c [--include tokens,symbols,ir,diagnostics] [--json]
+#
+# Protocol: newline-delimited JSON both ways. A request is
+#   {"id": 1, "source": "...", "include": ["ir", "diagnostics"],
+#    "optimize": false, "reuse_temps": false}
+# ({"op": "ping"} and {"op": "stats"} are also understood). The reply is a
+# stream of messages carrying the request id: "tokens", "symbols" and "ir"
+# messages with up to CHUNK items each, one "diagnostics" message, and a
+# final "done" message with ok and the compile stats. Requests on one
+# connection are answered in order.
+#
+# Backpressure: the next request on a connection is not read until the
+# previous reply has been drained to the socket, compiles run on at most
+# `workers` threads with one warm Parser each, and once max_pending compiles
+# are waiting new ones are answered at once with error "busy".
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"c-frontend-{os.getuid() if hasattr(os, 'getuid') else 0}.sock")
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 32
+DEFAULT_MAX_REQUEST = 16 << 20  # bytes in one request line
+CHUNK = 2000                    # items per streamed message
+EVENTS = ('tokens', 'symbols', 'ir', 'diagnostics')
+LOCATION = re.compile(r'at line (\d+)(?:, column (\d+))?')
+
+
+def encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+def parse_request(line):
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"bad JSON: {e}") from None
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    request.setdefault('id', None)
+    request.setdefault('op', 'compile')
+    if request['op'] not in ('compile', 'ping', 'stats'):
+        raise ValueError(f"unknown op {request['op']!r}")
+    if request['op'] == 'compile':
+        if not isinstance(request.get('source'), str):
+            raise ValueError("'source' must be a string")
+        include = request.setdefault('include', list(EVENTS))
+        if not isinstance(include, list) or not set(include) <= set(EVENTS):
+            raise ValueError(f"'include' must be a list of {', '.join(EVENTS)}")
+    return request
+
+
+def diagnostic(error, parser):
+    message = str(error)
+    match = LOCATION.search(message)
+    line = int(match.group(1)) if match else parser.line_number or None
+    column = int(match.group(2)) if match and match.group(2) else None
+    return {'severity': 'error', 'line': line, 'column': column, 'message': message}
+
+
+def compile_request(parser, request):
+    # Runs on a worker thread; returns {event: items, 'stats': ...}
+    include = request['include']
+    parser.reset()
+    tokens = [] if 'tokens' in include else None
+    diagnostics = []
+    try:
+        parser.parse_lines(parser.lexer.iter_lines(request['source']), tokens)
+        parser.validate_main()
+    except SyntaxError as e:
+        diagnostics.append(diagnostic(e, parser))
+    except Exception as e:
+        diagnostics.append({'severity': 'error', 'line': parser.line_number or None, 'column': None,
+                            'message': f"internal error: {e!r}"})
+
+    result = {}
+    if tokens is not None:
+        result['tokens'] = [[token.line, token.column, token.kind, token.value] for token in tokens]
+    if 'symbols' in include:
+        result['symbols'] = [[symbol.name, symbol.kind, symbol.type, symbol.scope, symbol.line, symbol.uses]
+                             for symbol in parser.symbol_table]
+    stats = parser.stats()
+    if not diagnostics:
+        code = parser.intermediate_code
+        if request.get('optimize'):
+            with timed(stats['seconds'], 'optimize'):
+                code, _ = optimize(code)
+        if request.get('reuse_temps'):
+            with timed(stats['seconds'], 'allocate'):
+                code, _ = allocate_temps(code)
+        if 'ir' in include:
+            result['ir'] = list(code.lines())
+    if 'diagnostics' in include:
+        result['diagnostics'] = diagnostics
+    result['ok'] = not diagnostics
+    result['stats'] = stats
+    return result
+
+
+class CompileServer:
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 max_request=DEFAULT_MAX_REQUEST):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_request = max_request
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='compile')
+        self.parsers = None  # queue of warm parsers, filled by start()
+        self.pending = 0     # compiles waiting for or holding a parser
+        self.server = None
+        self.counters = dict.fromkeys(('connections', 'requests', 'compiled', 'failed', 'rejected'), 0)
+
+    async def start(self, path=None, host=DEFAULT_HOST, port=None):
+        self.parsers = asyncio.Queue()
+        for _ in range(self.workers):
+            self.parsers.put_nowait(Parser())
+        if port is None:
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=self.max_request)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=self.max_request)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    async def handle(self, reader, writer):
+        self.counters['connections'] += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over the stream limit; the rest of the line cannot be skipped safely
+                    await self.send(writer, {'id': None, 'event': 'done', 'ok': False,
+                                             'error': f"request larger than {self.max_request} bytes"})
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await self.respond(line, writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, line, writer):
+        self.counters['requests'] += 1
+        try:
+            request = parse_request(line)
+        except ValueError as e:
+            self.counters['failed'] += 1
+            await self.send(writer, {'id': None, 'event': 'done', 'ok': False, 'error': str(e)})
+            return
+        id = request['id']
+        if request['op'] == 'ping':
+            await self.send(writer, {'id': id, 'event': 'done', 'ok': True})
+            return
+        if request['op'] == 'stats':
+            await self.send(writer, {'id': id, 'event': 'done', 'ok': True,
+                                     'stats': dict(self.counters, pending=self.pending, workers=self.workers)})
+            return
+        if self.pending >= self.max_pending:
+            self.counters['rejected'] += 1
+            await self.send(writer, {'id': id, 'event': 'done', 'ok': False, 'error': 'busy'})
+            return
+
+        self.pending += 1
+        try:
+            parser = await self.parsers.get()
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, compile_request, parser, request)
+            finally:
+                self.parsers.put_nowait(parser)
+        finally:
+            self.pending -= 1
+        self.counters['compiled' if result['ok'] else 'failed'] += 1
+
+        for event in EVENTS:
+            items = result.get(event)
+            if items is None:
+                continue
+            if event == 'diagnostics':
+                await self.send(writer, {'id': id, 'event': event, 'items': items})
+                continue
+            for start in range(0, len(items) or 1, CHUNK):
+                await self.send(writer, {'id': id, 'event': event, 'items': items[start:start + CHUNK]})
+        await self.send(writer, {'id': id, 'event': 'done', 'ok': result['ok'], 'stats': result['stats']})
+
+    async def send(self, writer, message):
+        writer.write(encode(message))
+        await writer.drain()
+
+
+def remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)  # left behind by a server that is gone
+    else:
+        raise OSError(f"a server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+async def serve(args):
+    server = CompileServer(args.workers, args.max_pending, args.max_request << 20)
+    if args.port is None:
+        remove_stale_socket(args.socket)
+        await server.start(args.socket)
+        where = args.socket
+    else:
+        await server.start(host=args.host, port=args.port)
+        where = f"{args.host}:{server.server.sockets[0].getsockname()[1]}"
+    print(f"Compile server listening on {where} ({args.workers} workers)", file=sys.stderr, flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, AttributeError):
+            pass  # Windows: Ctrl+C still ends asyncio.run()
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        if args.port is None:
+            try:
+                os.remove(args.socket)
+            except OSError:
+                pass
+
+
+def cmd_serve(args):
+    try:
+        asyncio.run(serve(args))
+    except OSError as e:
+        print(f"cannot start the compile server: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def connect(args):
+    if args.port is not None:
+        return socket.create_connection((args.host, args.port))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(args.socket)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(args, message):
+    # Sends one request and yields (raw line, message) until "done"
+    with connect(args) as sock, sock.makefile('rb') as replies:
+        sock.sendall(encode(message))
+        for line in replies:
+            reply = json.loads(line)
+            yield line, reply
+            if reply['event'] == 'done':
+                return
+    raise ConnectionError("the server closed the connection before replying")
+
+
+def show(message, name):
+    event = message['event']
+    items = message.get('items', ())
+    if event == 'tokens':
+        for line, column, kind, value in items:
+            print(f"{line}:{column}\t{kind}\t{value}")
+    elif event == 'symbols':
+        for row in items:
+            print('\t'.join(str(value) for value in row))
+    elif event == 'ir':
+        for line in items:
+            print(line)
+    elif event == 'diagnostics':
+        for item in items:
+            where = ':'.join(str(part) for part in (name, item['line'], item['column']) if part is not None)
+            print(f"{where}: {item['severity']}: {item['message']}", file=sys.stderr)
+    elif event == 'done' and message.get('error'):
+        print(f"{name}: {message['error']}", file=sys.stderr)
+
+
+def cmd_compile(args):
+    try:
+        with open(args.input) as f:
+            source = f.read()
+    except OSError as e:
+        print(f"{args.input}: {e}", file=sys.stderr)
+        return 2
+    include = args.include.split(',')
+    message = {'id': 1, 'source': source, 'include': include,
+               'optimize': args.optimize, 'reuse_temps': args.reuse_temps}
+    reply = None
+    try:
+        for line, reply in request(args, message):
+            if args.json:
+                sys.stdout.write(line.decode())
+            else:
+                show(reply, args.input)
+    except (OSError, ValueError) as e:
+        print(f"cannot reach the compile server: {e}", file=sys.stderr)
+        return 2
+    return 0 if reply['ok'] else 1
+
+
+def cmd_stats(args):
+    try:
+        for _, reply in request(args, {'op': 'stats'}):
+            print(json.dumps(reply['stats'], indent=2))
+    except (OSError, ValueError) as e:
+        print(f"cannot reach the compile server: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='daemon', description="Local compile server and client.")
+    address = argparse.ArgumentParser(add_help=False)
+    address.add_argument('--socket', default=DEFAULT_SOCKET, help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    address.add_argument('--port', type=int, default=None, help="use localhost TCP on this port instead")
+    address.add_argument('--host', default=DEFAULT_HOST, help=argparse.SUPPRESS)
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    serve_cmd = commands.add_parser('serve', parents=[address], help="run the compile server")
+    serve_cmd.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                           help="compiles running at once, each with its own warm parser")
+    serve_cmd.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                           help="compiles allowed to wait before requests are refused as busy")
+    serve_cmd.add_argument('--max-request', type=int, default=DEFAULT_MAX_REQUEST >> 20, metavar='MB',
+                           help="largest accepted request")
+    serve_cmd.set_defaults(func=cmd_serve)
+
+    compile_cmd = commands.add_parser('compile', parents=[address], help="compile a file on the server")
+    compile_cmd.add_argument('input')
+    compile_cmd.add_argument('--include', default='ir,diagnostics',
+                             help=f"comma-separated parts of the reply ({','.join(EVENTS)})")
+    compile_cmd.add_argument('-O', '--optimize', action='store_true', help="optimize the IR")
+    compile_cmd.add_argument('-R', '--reuse-temps', action='store_true', help="reuse temp slots")
+    compile_cmd.add_argument('--json', action='store_true', help="print the raw reply messages")
+    compile_cmd.set_defaults(func=cmd_compile)
+
+    stats_cmd = commands.add_parser('stats', parents=[address], help="print the server's counters")
+    stats_cmd.set_defaults(func=cmd_stats)
+
+    args = arg_parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+# Expression parsing for the code generator. Token values are turned into a
+# small tuple tree with a Pratt (precedence climbing) parser:
+#   ('operand', value)                 identifier, number or string literal
+#   ('call', name, [argument nodes])
+#   ('unary', op, node)                op is 'neg' or 'not'
+#   ('binary', op, left, right)
+
+PRECEDENCE = {
+    '||': 1,
+    '&&': 2,
+    '==': 3, '!=': 3,
+    '<': 4, '>': 4, '<=': 4, '>=': 4,
+    '+': 5, '-': 5,
+    '*': 6, '/': 6, '%': 6,
+}
+UNARY_PRECEDENCE = 7
+UNARY = {'-': 'neg', '!': 'not', '+': None}
+KNOWN_OPERATORS = frozenset(PRECEDENCE) | frozenset(UNARY)
+KEYWORDS = frozenset(('int', 'float', 'char', 'return', 'if', 'else', 'while', 'for', 'void', 'print'))
+
+
+def split_operators(values):
+    # The lexer matches operator runs greedily ("*-" in "x*-1"); break such
+    # runs into known operators, longest first
+    out = []
+    for value in values:
+        if value in KNOWN_OPERATORS or not value or value[0] not in '+-*/=<>!&|%':
+            out.append(value)
+            continue
+        rest = value
+        while rest:
+            if rest[:2] in KNOWN_OPERATORS:
+                out.append(rest[:2])
+                rest = rest[2:]
+            elif rest[:1] in KNOWN_OPERATORS:
+                out.append(rest[:1])
+                rest = rest[1:]
+            else:
+                out.append(rest)
+                break
+    return out
+
+
+
+def split_assignment(values):
+    # Same for the '=' that follows the name in a statement ("x=-1" lexes
+    # as x, '=-', 1); comparisons such as '==' are left alone
+    if values and values[0][:1] == '=' and values[0][:2] != '==' and len(values[0]) > 1:
+        return ['=', values[0][1:]] + values[1:]
+    return values
+
+
+def split_arguments(values):
+    # Splits a token value list at top-level commas
+    args = []
+    current = []
+    depth = 0
+    for value in values:
+        if value == ',' and depth == 0:
+            args.append(current)
+            current = []
+            continue
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        current.append(value)
+    if current or args:
+        args.append(current)
+    return args
+
+
+class ExpressionParser:
+    def __init__(self, values, line_number):
+        self.values = split_operators(values)
+        self.pos = 0
+        self.line_number = line_number
+
+    def error(self, message):
+        return SyntaxError(f"Syntax error at line {self.line_number}: {message} in expression "
+                           f"'{' '.join(self.values)}'")
+
+    def peek(self):
+        return self.values[self.pos] if self.pos < len(self.values) else None
+
+    def advance(self):
+        value = self.peek()
+        if value is None:
+            raise self.error("unexpected end")
+        self.pos += 1
+        return value
+
+    def expect(self, value):
+        if self.peek() != value:
+            raise self.error(f"expected '{value}'")
+        self.pos += 1
+
+    def parse(self):
+        node = self.expression(0)
+        if self.pos != len(self.values):
+            raise self.error(f"unexpected '{self.values[self.pos]}'")
+        return node
+
+    def expression(self, min_precedence):
+        left = self.prefix()
+        while True:
+            op = self.peek()
+            precedence = PRECEDENCE.get(op)
+            if precedence is None or precedence <= min_precedence:
+                return left
+            self.pos += 1
+            left = ('binary', op, left, self.expression(precedence))
+
+    def prefix(self):
+        value = self.advance()
+        if value == '(':
+            node = self.expression(0)
+            self.expect(')')
+            return node
+        if value in UNARY:
+            operand = self.expression(UNARY_PRECEDENCE)
+            return operand if UNARY[value] is None else ('unary', UNARY[value], operand)
+        first = value[0]
+        if first.isdigit() or first == '"':
+            return ('operand', value)
+        if (first.isalpha() or first == '_') and value not in KEYWORDS:
+            if self.peek() == '(':
+                self.pos += 1
+                return ('call', value, self.arguments())
+            return ('operand', value)
+        raise self.error(f"unexpected '{value}'")
+
+    def arguments(self):
+        args = []
+        if self.peek() == ')':
+            self.pos += 1
+            return args
+        while True:
+            args.append(self.expression(0))
+            value = self.advance()
+            if value == ')':
+                return args
+            if value != ',':
+                raise self.error(f"expected ',' or ')' but found '{value}'")
+
+
+def parse_expression(values, line_number=0):
+    return ExpressionParser(values, line_number).parse()
+
+
+def contains_call(node):
+    kind = node[0]
+    if kind == 'call':
+        return True
+    if kind == 'unary':
+        return contains_call(node[2])
+    if kind == 'binary':
+        return contains_call(node[2]) or contains_call(node[3])
+    return False
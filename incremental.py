@@ -0,0 +1,80 @@
+from parser import Parser
+from stats import new_stats, timed
+from symbols import SymbolTable
+from units import compile_unit, merge_code, shift_tokens, split_units
+
+# Editor-oriented recompilation: functions whose text has not changed since
+# the previous compile reuse their cached tokens, symbols and IR, so only the
+# edited function is lexed and parsed again.
+
+
+class IncrementalResult:
+    __slots__ = ('tokens', 'symbol_table', 'intermediate_code', 'reused', 'compiled', 'stats')
+
+    def __init__(self, tokens, symbol_table, intermediate_code, reused, compiled, stats):
+        self.tokens = tokens
+        self.symbol_table = symbol_table
+        self.intermediate_code = intermediate_code
+        self.reused = reused
+        self.compiled = compiled
+        self.stats = stats  # counters cover the whole program, times only recompiled chunks
+
+
+class IncrementalCompiler:
+    def __init__(self, cache=None):
+        self.parser = Parser()
+        self.units = {}  # chunk content hash -> CompiledUnit
+        self.cache = cache  # optional on-disk CompileCache behind self.units
+
+    def compile(self, source, check=None):
+        # check, if given, is called before each chunk and may raise to abort
+        units = {}
+        ordered = []
+        tokens = []
+        symbol_table = SymbolTable()
+        main_found = False
+        reused = compiled = 0
+        stats = new_stats()
+        seconds = stats['seconds']
+
+        for chunk in split_units(source):
+            if check is not None:
+                check()
+            unit = units.get(chunk.key) or self.units.get(chunk.key)
+            if unit is None and self.cache is not None:
+                unit, unit_stats, hit = self.cache.compile(chunk, self.parser)
+                for phase, value in unit_stats['seconds'].items():
+                    seconds[phase] = seconds.get(phase, 0.0) + value
+                if hit:
+                    reused += 1
+                else:
+                    compiled += 1
+            elif unit is None:
+                unit = compile_unit(chunk, self.parser)
+                for phase, value in self.parser.timings.items():
+                    seconds[phase] += value
+                compiled += 1
+            else:
+                reused += 1
+            units[chunk.key] = unit
+            ordered.append(unit)
+
+            delta = chunk.start_line - unit.start_line
+            tokens.extend(shift_tokens(unit.tokens, delta))
+            symbol_table.add_symbols(unit.symbols, unit.forward, delta)
+            main_found = main_found or unit.main_found
+            stats['temps'] += unit.temps
+            stats['labels'] += unit.labels
+
+        # Only the chunks of the latest buffer are kept
+        self.units = units
+
+        if not main_found:
+            raise SyntaxError("Program must start with a 'main' function.")
+        with timed(seconds, 'ir'):
+            code = merge_code(ordered)
+        stats['lines'] = len({token.line for token in tokens})
+        stats['tokens'] = len(tokens)
+        stats['instructions'] = len(code)
+        stats['symbols'] = len(symbol_table)
+        return IncrementalResult(tokens, symbol_table, code, reused, compiled, stats)
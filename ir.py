@@ -0,0 +1,224 @@
+from array import array
+
+# Three-address code stored as parallel arrays: one opcode byte and three
+# operand ids per instruction. An operand id >= 0 indexes a per-buffer table
+# of distinct operand strings, -1 means "no operand" and an id <= -2 encodes
+# the temp t<-id - 1> without storing its name. Variable-length operand lists
+# (call/print arguments, function parameters) live in a side table.
+#
+# Instruction layout (op, arg1, arg2, result) and its text form:
+#   func      -, -, name          func name:
+#   label     -, -, L             L:
+#   goto      -, -, L             goto L
+#   if        c, -, L             if c goto L
+#   ifnot     c, -, L             if not c goto L
+#   copy      a, -, x             x = a
+#   <binop>   a, b, t             t = a <binop> b
+#   neg/not   a, -, t             t = -a / t = !a
+#   call      f, -, t  + args     t = call f(args)
+#   print     -, -, -  + args     print(args)
+#   return    a, -, -             return a   (or bare return)
+
+BINARY_OPERATORS = ('+', '-', '*', '/', '%', '<', '>', '<=', '>=', '==', '!=', '&&', '||')
+UNARY_OPERATORS = ('neg', 'not')
+OPCODES = ('func', 'label', 'goto', 'if', 'ifnot', 'copy', 'call', 'print', 'return') + BINARY_OPERATORS + UNARY_OPERATORS
+OPCODE = {name: code for code, name in enumerate(OPCODES)}
+BINARY = frozenset(OPCODE[op] for op in BINARY_OPERATORS)
+UNARY = frozenset(OPCODE[op] for op in UNARY_OPERATORS)
+
+FUNC, LABEL, GOTO, IF, IFNOT, COPY, CALL, PRINT, RETURN = range(9)
+
+
+class Instr:
+    __slots__ = ('op', 'arg1', 'arg2', 'result', 'args')
+
+    def __init__(self, op, arg1=None, arg2=None, result=None, args=()):
+        self.op = op
+        self.arg1 = arg1
+        self.arg2 = arg2
+        self.result = result
+        self.args = args
+
+    def __eq__(self, other):
+        return (isinstance(other, Instr) and self.op == other.op and self.arg1 == other.arg1 and
+                self.arg2 == other.arg2 and self.result == other.result and self.args == other.args)
+
+    def __repr__(self):
+        return f"Instr({self.op!r}, {self.arg1!r}, {self.arg2!r}, {self.result!r}, {self.args!r})"
+
+    def __str__(self):
+        return format_instr(self.op, self.arg1, self.arg2, self.result, self.args)
+
+    def uses(self):
+        # Operands read by the instruction (labels and function names excluded)
+        op = self.op
+        if op in ('copy', 'if', 'ifnot', 'return', 'neg', 'not'):
+            return () if self.arg1 is None else (self.arg1,)
+        if op in ('call', 'print'):
+            return self.args
+        if op in BINARY_OPERATORS:
+            return (self.arg1, self.arg2)
+        return ()
+
+    def defines(self):
+        # Name written by the instruction, if any
+        if self.op in ('copy', 'call', 'neg', 'not') or self.op in BINARY_OPERATORS:
+            return self.result
+        return None
+
+    def is_jump(self):
+        return self.op in ('goto', 'if', 'ifnot')
+
+
+def format_instr(op, arg1, arg2, result, args):
+    if op == 'copy':
+        return f"{result} = {arg1}"
+    if op == 'label':
+        return f"{result}:"
+    if op == 'goto':
+        return f"goto {result}"
+    if op == 'if':
+        return f"if {arg1} goto {result}"
+    if op == 'ifnot':
+        return f"if not {arg1} goto {result}"
+    if op == 'call':
+        return f"{result} = call {arg1}({', '.join(args)})"
+    if op == 'print':
+        return f"print({', '.join(args)})"
+    if op == 'return':
+        return "return" if arg1 is None else f"return {arg1}"
+    if op == 'func':
+        return f"func {result}:"
+    if op == 'neg':
+        return f"{result} = -{arg1}"
+    if op == 'not':
+        return f"{result} = !{arg1}"
+    return f"{result} = {arg1} {op} {arg2}"
+
+
+def is_temp(name):
+    return (name is not None and name[:1] == 't' and name[1:].isdecimal() and
+            name[1] != '0' and name.isascii())
+
+
+def is_generated(name):
+    # Spelling reserved for compiler-generated names: temps t<n> and labels
+    # L<n>. User identifiers of this shape get another IR name (symbols.py)
+    return len(name) > 1 and name[0] in 'tL' and name[1:].isdecimal() and name.isascii()
+
+
+def is_constant(name):
+    if name is None:
+        return False
+    digits = name[1:] if name[:1] == '-' else name
+    return digits.isdecimal() and digits.isascii()
+
+
+def shift_name(name, temp_offset, label_offset):
+    # Compiler-generated names are t<n> (temps) and L<n> (labels)
+    if len(name) > 1 and name[1:].isdigit():
+        if name[0] == 't' and temp_offset:
+            return f"t{int(name[1:]) + temp_offset}"
+        if name[0] == 'L' and label_offset:
+            return f"L{int(name[1:]) + label_offset}"
+    return name
+
+
+class IRBuffer:
+    __slots__ = ('ops', 'arg1', 'arg2', 'result', 'extra', 'operands', 'operand_ids')
+
+    def __init__(self):
+        self.ops = array('B')
+        self.arg1 = array('i')
+        self.arg2 = array('i')
+        self.result = array('i')
+        self.extra = {}  # instruction index -> tuple of operand ids
+        self.operands = []
+        self.operand_ids = {}
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        operand_id = self.operand_ids.get(value)
+        if operand_id is None:
+            if is_temp(value):
+                return -1 - int(value[1:])
+            operand_id = len(self.operands)
+            self.operands.append(value)
+            self.operand_ids[value] = operand_id
+        return operand_id
+
+    def append(self, op, arg1=None, arg2=None, result=None, args=None):
+        intern = self.intern
+        if args is not None:
+            self.extra[len(self.ops)] = tuple(intern(a) for a in args)
+        self.ops.append(OPCODE[op])
+        self.arg1.append(intern(arg1))
+        self.arg2.append(intern(arg2))
+        self.result.append(intern(result))
+
+    def append_instr(self, instr):
+        args = instr.args if instr.op in ('call', 'print', 'func') else None
+        self.append(instr.op, instr.arg1, instr.arg2, instr.result, args)
+
+    def extend(self, other, temp_offset=0, label_offset=0):
+        # Appends another buffer, remapping its operand ids into this table
+        # and optionally shifting its generated temp and label numbers
+        if label_offset:
+            mapping = [self.intern(shift_name(v, 0, label_offset)) for v in other.operands]
+        else:
+            mapping = [self.intern(v) for v in other.operands]
+        mapping.append(-1)  # id -1 stays "no operand"
+
+        def remap(ids):
+            return [mapping[i] if i >= -1 else i - temp_offset for i in ids]
+
+        base = len(self.ops)
+        self.ops.extend(other.ops)
+        self.arg1.extend(remap(other.arg1))
+        self.arg2.extend(remap(other.arg2))
+        self.result.extend(remap(other.result))
+        for index, ids in other.extra.items():
+            self.extra[base + index] = tuple(remap(ids))
+
+    def operand(self, operand_id):
+        if operand_id >= 0:
+            return self.operands[operand_id]
+        if operand_id == -1:
+            return None
+        return f"t{-1 - operand_id}"
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.ops)
+        operand = self.operand
+        args = tuple(operand(i) for i in self.extra.get(index, ()))
+        return Instr(OPCODES[self.ops[index]], operand(self.arg1[index]), operand(self.arg2[index]),
+                     operand(self.result[index]), args)
+
+    def __iter__(self):
+        for index in range(len(self.ops)):
+            yield self[index]
+
+    def lines(self):
+        operand = self.operand
+        extra = self.extra
+        for index, (op, a, b, r) in enumerate(zip(self.ops, self.arg1, self.arg2, self.result)):
+            args = [operand(i) for i in extra[index]] if index in extra else ()
+            yield format_instr(OPCODES[op], operand(a), operand(b), operand(r), args)
+
+
+def from_instrs(instrs):
+    code = IRBuffer()
+    for instr in instrs:
+        code.append_instr(instr)
+    return code
+
+
+def to_text(code):
+    if isinstance(code, IRBuffer):
+        return '\n'.join(code.lines())
+    return '\n'.join(str(instr) for instr in code)
@@ -1,4 +1,23 @@
-import re
+import os
+from collections import namedtuple
+
+Token = namedtuple('Token', 'kind value line column')
+
+
+MASTER = None  # shared by every regex Lexer (and so every Parser), compiled on first use
+
+
+def master_pattern(specification):
+    import re  # the table engine runs without it
+    return re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in specification))
+
+
+def shared_master():
+    global MASTER
+    if MASTER is None:
+        MASTER = master_pattern(Lexer.TOKEN_SPECIFICATION)
+    return MASTER
+
 
 class Lexer:
     TOKEN_SPECIFICATION = [
@@ -10,29 +29,73 @@ class Lexer:
         ('NUMBER',     r'\b\d+(\.\d+)?\b'),
         ('OPERATOR',   r'[+\-*/=<>!&|\%]+'),
         ('DELIMITER',  r'[(){},;]'),
-        ('SKIP',       r'[ \t]+'),
+        ('SKIP',       r'[ \t\r]+'),
         ('NEWLINE',    r'\n'),
         ('MISMATCH',   r'.'),
     ]
 
-    def __init__(self):
-        token_regex = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in self.TOKEN_SPECIFICATION)
-        self.get_token = re.compile(token_regex).match
+    # 'regex' matches TOKEN_SPECIFICATION directly; 'table' uses the
+    # equivalent table-driven scanner in table_lexer.py
+    ENGINES = ('regex', 'table')
+    DEFAULT_ENGINE = os.environ.get('LEXER_ENGINE', 'regex')
 
-    def tokenize(self, line):
-        pos = 0
-        tokens = []
-        while pos < len(line):
-            match = self.get_token(line, pos)
-            if not match:
-                raise SyntaxError(f'Unexpected character: {line[pos]}')
+    def __init__(self, engine=None):
+        self.engine = engine or self.DEFAULT_ENGINE
+        if self.engine not in self.ENGINES:
+            raise ValueError(f"unknown lexer engine {self.engine!r}")
+        if self.engine == 'table':
+            # The table engine never needs the master regex
+            from table_lexer import TableLexer
+            table = TableLexer()
+            self.iter_tokens = table.iter_tokens
+            self.iter_lines = table.iter_lines
+        elif self.TOKEN_SPECIFICATION is Lexer.TOKEN_SPECIFICATION:
+            self.scan = shared_master().finditer
+        else:
+            self.scan = master_pattern(self.TOKEN_SPECIFICATION).finditer
+
+    def tokenize(self, text, line=1):
+        # [(kind, value)] for one line, from the selected engine
+        return [token[:2] for token in self.iter_tokens(text, line)]
+
+    def iter_tokens(self, source, line=1):
+        # One pass over the whole buffer; yields Token(kind, value, line, column)
+        line_start = 0
+        for match in self.scan(source):
             kind = match.lastgroup
+            if kind == 'SKIP':
+                continue
+            if kind == 'NEWLINE':
+                line += 1
+                line_start = match.end()
+                continue
             value = match.group()
-            if kind in ('SKIP', 'NEWLINE'):
-                pass
-            elif kind == 'MISMATCH':
-                raise SyntaxError(f'Illegal token: {value}')
-            else:
-                tokens.append((kind, value))
-            pos = match.end()
-        return tokens
+            column = match.start() - line_start + 1
+            if kind == 'MISMATCH':
+                raise SyntaxError(f'Illegal token: {value} at line {line}, column {column}')
+            yield Token(kind, value, line, column)
+
+    def iter_lines(self, source, line=1):
+        # Groups iter_tokens output into (line_number, tokens) pairs; blank lines are skipped
+        tokens = []
+        line -= 1
+        for token in self.iter_tokens(source, line + 1):
+            if token.line != line:
+                if tokens:
+                    yield line, tokens
+                tokens = []
+                line = token.line
+            tokens.append(token)
+        if tokens:
+            yield line, tokens
+
+    def iter_file(self, stream, line=1, block_size=1 << 16):
+        # iter_lines over an open text file, reading about block_size
+        # characters of whole lines at a time
+        while True:
+            block = stream.readlines(block_size)
+            if not block:
+                return
+            yield from self.iter_lines(''.join(block), line)
+            line += len(block)
+
@@ -1,7 +1,51 @@
 import sys
-import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
-from parser import Parser
+from background import CompileWorker
+from sinks import open_sink
+
+POLL_MS = 30  # how often the GUI checks for a finished compile
+
+# tkinter is imported by load_tk() when the GUI starts, so importing this
+# module on a headless machine (or for its helpers) does not pay for it
+tk = ttk = scrolledtext = messagebox = filedialog = None
+
+def load_tk():
+    global tk, ttk, scrolledtext, messagebox, filedialog
+    import tkinter as tk
+    from tkinter import ttk, scrolledtext, messagebox, filedialog
+
+class LazyTree:
+    # Feeds a Treeview its rows a page at a time: the first page is inserted
+    # straight away and further pages only once the view is scrolled near
+    # the end of what has been inserted, so large results stay cheap
+    PAGE = 200
+
+    def __init__(self, tree, scrollbar, frame, title):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.frame = frame
+        self.title = title
+        self.rows = []
+        self.shown = 0
+        tree.configure(yscrollcommand=self.on_scroll)
+
+    def set_rows(self, rows):
+        self.tree.delete(*self.tree.get_children())
+        self.rows = rows
+        self.shown = 0
+        self.frame.config(text=f"{self.title} ({len(rows)})" if rows else self.title)
+        self.more()
+
+    def more(self):
+        end = min(self.shown + self.PAGE, len(self.rows))
+        insert = self.tree.insert
+        for values in self.rows[self.shown:end]:
+            insert("", "end", values=values)
+        self.shown = end
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.shown < len(self.rows) and float(last) > 0.9:
+            self.tree.after_idle(self.more)
 
 class ParserGUI:
     def __init__(self, root):
@@ -9,7 +53,11 @@ class ParserGUI:
         self.root.title("C Parser & Intermediate Code Generator")
         self.root.geometry("1300x800")
 
+        self.worker = CompileWorker()
+        self.pending = None  # job number of the compile in flight
+        self.last_code = None
         self.create_layout()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
     def create_layout(self):
         # ==== MAIN SPLIT FRAME ====
@@ -37,6 +85,15 @@ class ParserGUI:
         )
         self.submit_btn.pack(pady=5)
 
+        self.status = tk.Label(left_frame, text="", anchor='w')
+        self.status.pack(fill='x', padx=5)
+
+        self.incremental_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            left_frame, text="Incremental (recompile changed functions only)",
+            variable=self.incremental_var
+        ).pack()
+
         # Token Table
         token_frame = tk.LabelFrame(left_frame, text="Tokens by Line", font=("Arial", 12, "bold"))
         token_frame.pack(fill='both', expand=True, padx=5, pady=5)
@@ -46,19 +103,25 @@ class ParserGUI:
         for col in columns:
             self.token_tree.heading(col, text=col)
             self.token_tree.column(col, width=100 if col != "Token Value" else 300, anchor='w')
+        token_scroll = ttk.Scrollbar(token_frame, orient='vertical', command=self.token_tree.yview)
+        token_scroll.pack(side='right', fill='y', pady=5)
         self.token_tree.pack(padx=5, pady=5, fill='both', expand=True)
+        self.token_view = LazyTree(self.token_tree, token_scroll, token_frame, "Tokens by Line")
 
         # ==== RIGHT SIDE ====
         # Symbol Table
         symbol_frame = tk.LabelFrame(right_frame, text="Symbol Table", font=("Arial", 12, "bold"))
         symbol_frame.pack(fill='both', expand=True, padx=5, pady=5)
 
-        sym_columns = ("Symbol Name", "Symbol Type")
+        sym_columns = ("Symbol Name", "Kind", "Type", "Scope", "Line", "Uses")
         self.symbol_tree = ttk.Treeview(symbol_frame, columns=sym_columns, show='headings', height=10)
         for col in sym_columns:
             self.symbol_tree.heading(col, text=col)
-            self.symbol_tree.column(col, width=150, anchor='w')
+            self.symbol_tree.column(col, width=150 if col == "Symbol Name" else 70, anchor='w')
+        symbol_scroll = ttk.Scrollbar(symbol_frame, orient='vertical', command=self.symbol_tree.yview)
+        symbol_scroll.pack(side='right', fill='y', pady=5)
         self.symbol_tree.pack(padx=5, pady=5, fill='both', expand=True)
+        self.symbol_view = LazyTree(self.symbol_tree, symbol_scroll, symbol_frame, "Symbol Table")
 
         # Intermediate Code
         ir_frame = tk.LabelFrame(right_frame, text="Intermediate Code", font=("Arial", 12, "bold"))
@@ -67,48 +130,76 @@ class ParserGUI:
         self.ir_output = scrolledtext.ScrolledText(ir_frame, font=("Courier", 10), height=12, state='disabled', bg="#f9f9f9")
         self.ir_output.pack(padx=5, pady=5, fill='both', expand=True)
 
+        self.save_btn = tk.Button(ir_frame, text="Save IR...", command=self.save_ir, state='disabled')
+        self.save_btn.pack(pady=(0, 5))
+
+        # Compilation statistics
+        stats_frame = tk.LabelFrame(right_frame, text="Statistics", font=("Arial", 12, "bold"))
+        stats_frame.pack(fill='x', padx=5, pady=5)
+
+        self.stats_output = tk.Text(stats_frame, font=("Courier", 10), height=9, state='disabled', bg="#f9f9f9")
+        self.stats_output.pack(padx=5, pady=5, fill='x')
+
     def parse_code(self):
         code = self.text_area.get("1.0", tk.END).strip()
         if not code:
             messagebox.showwarning("Input Error", "Please enter C code before submitting.")
             return
 
-        parser = Parser()
-
-        # Clear old output
-        self.token_tree.delete(*self.token_tree.get_children())
-        self.symbol_tree.delete(*self.symbol_tree.get_children())
-        self.set_text(self.ir_output, "")
+        # Compiling happens on the worker thread; submitting again abandons
+        # the compile still in flight
+        was_pending = self.pending is not None
+        self.pending = self.worker.submit(code, self.incremental_var.get())
+        self.status.config(text="Compiling...")
+        if not was_pending:
+            self.root.after(POLL_MS, self.poll_worker)
 
+    def poll_worker(self):
+        if self.pending is None:
+            return
+        result = self.worker.poll()
+        if result is None or result[0] != self.pending:
+            self.root.after(POLL_MS, self.poll_worker)
+            return
+        self.pending = None
+        _, output, error = result
+        if error is not None:
+            self.status.config(text="Failed")
+            if isinstance(error, SyntaxError):
+                messagebox.showerror("Syntax Error", str(error))
+            else:
+                messagebox.showerror("Internal Error", repr(error))
+            return
+        self.show(output)
+        self.status.config(text="Done")
+        messagebox.showinfo("Success", "Parsing successful. Intermediate code generated.")
+
+    def show(self, output):
+        self.token_view.set_rows(output.token_rows)
+        self.symbol_view.set_rows(output.symbol_rows)
+        # Intermediate code stays in memory; Save IR... writes it out
+        self.set_text(self.ir_output, output.text)
+        self.last_code = output.code
+        self.save_btn.config(state='normal')
+        self.set_text(self.stats_output, output.summary)
+
+    def save_ir(self):
+        if self.last_code is None:
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=".txt", initialfile="intermediate_code.txt",
+            filetypes=[("Text IR", "*.txt *.ir"), ("Binary IR", "*.irb"), ("All files", "*.*")])
+        if not path:
+            return
         try:
-            lines = code.split('\n')
-            for line_number, line in enumerate(lines, 1):
-                stripped = line.strip()
-                if not stripped:
-                    continue
-
-                # Tokenize and show tokens
-                tokens = parser.lexer.tokenize(stripped)
-                for token in tokens:
-                    self.token_tree.insert("", "end", values=(line_number, token[0], token[1]))
-
-                parser.parse_line(stripped, line_number)
-
-            parser.validate_main()
-
-            # Symbol Table Display (Tree)
-            for symbol, kind in parser.symbol_table.items():
-                self.symbol_tree.insert("", "end", values=(symbol, kind))
-
-            # Intermediate code
-            parser.write_intermediate_code()
-            with open("intermediate_code.txt", "r") as f:
-                self.set_text(self.ir_output, f.read().strip())
-
-            messagebox.showinfo("Success", "Parsing successful. Intermediate code generated.")
+            with open_sink(path) as sink:
+                sink.write(self.last_code)
+        except OSError as e:
+            messagebox.showerror("Save Error", str(e))
 
-        except SyntaxError as e:
-            messagebox.showerror("Syntax Error", str(e))
+    def close(self):
+        self.worker.close()
+        self.root.destroy()
 
     def set_text(self, widget, content):
         widget.config(state='normal')
@@ -117,6 +208,7 @@ class ParserGUI:
         widget.config(state='disabled')
 
 def main():
+    load_tk()
     root = tk.Tk()
     app = ParserGUI(root)
     root.mainloop()
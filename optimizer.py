@@ -0,0 +1,282 @@
+from ir import BINARY_OPERATORS, UNARY_OPERATORS, Instr, from_instrs, is_constant, is_temp
+
+# Optional clean-up passes over the emitted three-address code (-O). Every
+# pass takes one function's instructions and returns a new list; the pass
+# manager repeats the pipeline until nothing changes.
+
+PURE = frozenset(BINARY_OPERATORS + UNARY_OPERATORS + ('copy',))
+BLOCK_END = frozenset(('goto', 'if', 'ifnot', 'return'))
+
+
+def fold_value(op, a, b):
+    if op == '+':
+        return a + b
+    if op == '-':
+        return a - b
+    if op == '*':
+        return a * b
+    if op in ('/', '%'):
+        if b == 0:
+            return None
+        # C division truncates toward zero
+        quotient = abs(a) // abs(b)
+        if (a < 0) != (b < 0):
+            quotient = -quotient
+        return quotient if op == '/' else a - b * quotient
+    if op == '<':
+        return int(a < b)
+    if op == '>':
+        return int(a > b)
+    if op == '<=':
+        return int(a <= b)
+    if op == '>=':
+        return int(a >= b)
+    if op == '==':
+        return int(a == b)
+    if op == '!=':
+        return int(a != b)
+    if op == '&&':
+        return int(a != 0 and b != 0)
+    if op == '||':
+        return int(a != 0 or b != 0)
+    return None
+
+
+def simplify(instr):
+    # Algebraic identities that need only one constant operand
+    op, a, b = instr.op, instr.arg1, instr.arg2
+    if (op in ('+', '-') and b == '0') or (op in ('*', '/') and b == '1'):
+        return Instr('copy', a, result=instr.result)
+    if (op == '+' and a == '0') or (op == '*' and a == '1'):
+        return Instr('copy', b, result=instr.result)
+    if op == '*' and (a == '0' or b == '0'):
+        return Instr('copy', '0', result=instr.result)
+    return instr
+
+
+def fold_constants(instrs):
+    out = []
+    for instr in instrs:
+        op = instr.op
+        if op in BINARY_OPERATORS:
+            if is_constant(instr.arg1) and is_constant(instr.arg2):
+                value = fold_value(op, int(instr.arg1), int(instr.arg2))
+                if value is not None:
+                    instr = Instr('copy', str(value), result=instr.result)
+            else:
+                instr = simplify(instr)
+        elif op in UNARY_OPERATORS and is_constant(instr.arg1):
+            value = -int(instr.arg1) if op == 'neg' else int(int(instr.arg1) == 0)
+            instr = Instr('copy', str(value), result=instr.result)
+        elif op in ('if', 'ifnot') and is_constant(instr.arg1):
+            taken = (int(instr.arg1) != 0) == (op == 'if')
+            if not taken:
+                continue
+            instr = Instr('goto', result=instr.result)
+        out.append(instr)
+    return out
+
+
+def use_counts(instrs):
+    counts = {}
+    for instr in instrs:
+        for name in instr.uses():
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def coalesce_copies(instrs):
+    # t = a op b; x = t  ->  x = a op b   when t is used nowhere else
+    counts = use_counts(instrs)
+    out = []
+    for instr in instrs:
+        if (instr.op == 'copy' and out and is_temp(instr.arg1) and
+                counts.get(instr.arg1) == 1 and out[-1].defines() == instr.arg1):
+            previous = out[-1]
+            out[-1] = Instr(previous.op, previous.arg1, previous.arg2, instr.result, previous.args)
+            continue
+        out.append(instr)
+    return out
+
+
+def propagate_copies(instrs):
+    # Within a basic block, reads of x after x = y are replaced by y until
+    # either x or y is reassigned
+    out = []
+    copies = {}   # x -> y
+    readers = {}  # y -> names currently copied from y
+    for instr in instrs:
+        op = instr.op
+        if op in ('label', 'func'):
+            copies.clear()
+            readers.clear()
+            out.append(instr)
+            continue
+
+        if copies:
+            if op in ('call', 'print'):
+                args = tuple(copies.get(a, a) for a in instr.args)
+                if args != instr.args:
+                    instr = Instr(op, instr.arg1, instr.arg2, instr.result, args)
+            elif op in ('copy', 'if', 'ifnot', 'return') or op in PURE:
+                arg1 = copies.get(instr.arg1, instr.arg1)
+                arg2 = copies.get(instr.arg2, instr.arg2)
+                if arg1 != instr.arg1 or arg2 != instr.arg2:
+                    instr = Instr(op, arg1, arg2, instr.result, instr.args)
+
+        target = instr.defines()
+        if target is not None:
+            source = copies.pop(target, None)
+            if source is not None:
+                readers[source].discard(target)
+            for name in readers.pop(target, ()):
+                del copies[name]
+            if op == 'copy' and instr.arg1 != target:
+                copies[target] = instr.arg1
+                readers.setdefault(instr.arg1, set()).add(target)
+
+        out.append(instr)
+        if op in BLOCK_END:
+            copies.clear()
+            readers.clear()
+    return out
+
+
+def eliminate_dead_code(instrs):
+    # Unreachable code after an unconditional jump or return
+    live = []
+    reachable = True
+    for instr in instrs:
+        if instr.op in ('label', 'func'):
+            reachable = True
+        if reachable:
+            live.append(instr)
+        if instr.op in ('goto', 'return'):
+            reachable = False
+
+    # Pure definitions of temps that are never read, then labels nobody jumps to
+    counts = use_counts(live)
+    targets = {instr.result for instr in live if instr.is_jump()}
+    out = []
+    for instr in live:
+        op = instr.op
+        if op in PURE and is_temp(instr.result) and not counts.get(instr.result):
+            continue
+        if op == 'copy' and instr.arg1 == instr.result:
+            continue
+        if op == 'label' and instr.result not in targets:
+            continue
+        out.append(instr)
+    return out
+
+
+def thread_jumps(instrs):
+    # Where each label leads once any chain of labels and gotos is followed
+    forward = {}
+    pending = []
+    for instr in instrs:
+        if instr.op == 'label':
+            pending.append(instr.result)
+            continue
+        if instr.op == 'goto':
+            for label in pending:
+                forward[label] = instr.result
+        pending = []
+
+    def resolve(label):
+        seen = {label}
+        while label in forward and forward[label] not in seen:
+            label = forward[label]
+            seen.add(label)
+        return label
+
+    out = []
+    count = len(instrs)
+    i = 0
+    while i < count:
+        instr = instrs[i]
+        if instr.is_jump():
+            target = resolve(instr.result)
+            # if c goto L1; goto L2; L1:  ->  if not c goto L2; L1:
+            if (instr.op in ('if', 'ifnot') and i + 2 < count and instrs[i + 1].op == 'goto' and
+                    instrs[i + 2].op == 'label' and instrs[i + 2].result == instr.result):
+                inverted = 'ifnot' if instr.op == 'if' else 'if'
+                instr = Instr(inverted, instr.arg1, result=resolve(instrs[i + 1].result))
+                i += 1
+            elif target != instr.result:
+                instr = Instr(instr.op, instr.arg1, result=target)
+            # A jump to the label that immediately follows does nothing
+            j = i + 1
+            while j < count and instrs[j].op == 'label':
+                if instrs[j].result == instr.result:
+                    break
+                j += 1
+            if j < count and instrs[j].op == 'label':
+                i += 1
+                continue
+        out.append(instr)
+        i += 1
+    return out
+
+
+PASSES = (
+    ('fold', fold_constants),
+    ('coalesce', coalesce_copies),
+    ('copy-propagation', propagate_copies),
+    ('dead-code', eliminate_dead_code),
+    ('jump-threading', thread_jumps),
+)
+
+
+class OptimizationReport:
+    __slots__ = ('before', 'after', 'rounds', 'removed')
+
+    def __init__(self, before):
+        self.before = before
+        self.after = before
+        self.rounds = 0
+        self.removed = {}  # pass name -> instructions removed
+
+    def __str__(self):
+        detail = ', '.join(f"{name} -{count}" for name, count in self.removed.items() if count)
+        return (f"{self.before} -> {self.after} instructions in {self.rounds} rounds"
+                + (f" ({detail})" if detail else ""))
+
+
+def split_functions(instrs):
+    functions = []
+    current = []
+    for instr in instrs:
+        if instr.op == 'func' and current:
+            functions.append(current)
+            current = []
+        current.append(instr)
+    if current:
+        functions.append(current)
+    return functions
+
+
+def optimize_function(instrs, passes=PASSES, max_rounds=10, report=None):
+    rounds = 0
+    while rounds < max_rounds:
+        before = instrs
+        for name, run in passes:
+            size = len(instrs)
+            instrs = run(instrs)
+            if report is not None:
+                report.removed[name] = report.removed.get(name, 0) + size - len(instrs)
+        rounds += 1
+        if instrs == before:
+            break
+    if report is not None:
+        report.rounds = max(report.rounds, rounds)
+    return instrs
+
+
+def optimize(code, passes=PASSES, max_rounds=10):
+    report = OptimizationReport(len(code))
+    optimized = []
+    for function in split_functions(list(code)):
+        optimized.extend(optimize_function(function, passes, max_rounds, report))
+    report.after = len(optimized)
+    return from_instrs(optimized), report
@@ -0,0 +1,119 @@
+import os
+from functools import partial
+
+from cache import dump_unit, load_unit
+from parser import Parser
+from stats import add_stats, new_stats, timed
+from symbols import SymbolTable
+from units import Chunk, CompiledUnit, compile_unit, merge_code, split_units
+
+# Compiles one translation unit on several cores. The source is split at
+# function boundaries (units.split_units), contiguous runs of chunks are
+# compiled in worker processes, each chunk with its own temp and label
+# numbering, and the results are merged in source order: merge_code shifts
+# the numbering exactly as a serial compile would have produced it and
+# SymbolTable.add_symbols rebuilds the combined table, so the output does
+# not depend on the number of workers or on which finished first.
+#
+# Units travel back in the cache's serialized form, which keeps the IR as
+# raw array bytes and leaves the tokens out unless they are wanted. With one
+# job, or a source too small to be worth starting workers for, the whole
+# source is compiled serially instead.
+
+PARALLEL_MIN_LINES = 4000  # smaller sources are not worth starting workers for
+BATCHES_PER_JOB = 4        # several batches per worker keep the tail short
+
+worker_parser = None  # one warm parser per worker process
+
+
+def compile_batch(chunks, with_tokens=True):
+    global worker_parser
+    if worker_parser is None:
+        worker_parser = Parser()
+    out = []
+    for chunk in chunks:
+        unit = compile_unit(chunk, worker_parser)
+        if not with_tokens:
+            unit.tokens = []
+        out.append(dump_unit(unit, worker_parser.stats()))
+    return out
+
+
+def batches(chunks, count):
+    # Splits chunks into at most count contiguous runs of similar text size
+    total = sum(len(chunk.text) for chunk in chunks)
+    target = total / count
+    runs = []
+    run = []
+    size = 0
+    for chunk in chunks:
+        run.append(chunk)
+        size += len(chunk.text)
+        if size >= target * (len(runs) + 1) and len(runs) < count - 1:
+            runs.append(run)
+            run = []
+    if run:
+        runs.append(run)
+    return runs
+
+
+def compile_chunks(chunks, jobs=None, with_tokens=True):
+    # Returns [(CompiledUnit, stats)] in chunk order
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(chunks) == 1:
+        parser = Parser()
+        return [(compile_unit(chunk, parser), parser.stats()) for chunk in chunks]
+    from concurrent.futures import ProcessPoolExecutor  # only worth importing for big sources
+    results = []
+    work = batches(chunks, jobs * BATCHES_PER_JOB)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as pool:
+        # map() yields in submission order, so the first error in the
+        # source is the one raised
+        for batch in pool.map(partial(compile_batch, with_tokens=with_tokens), work):
+            results.extend(load_unit(data, with_tokens) for data in batch)
+    return results
+
+
+def merge_units(units):
+    # Combines units compiled separately into one CompiledUnit
+    tokens = []
+    table = SymbolTable()
+    temps = labels = 0
+    main_found = False
+    for unit in units:
+        tokens.extend(unit.tokens)
+        table.add_symbols(unit.symbols, unit.forward)
+        temps += unit.temps
+        labels += unit.labels
+        main_found = main_found or unit.main_found
+    start_line = units[0].start_line if units else 1
+    return CompiledUnit(start_line, tokens, table.symbols, table.forward, merge_code(units),
+                        temps, labels, main_found), table
+
+
+def compile_parallel(source, jobs=None, with_tokens=True):
+    # Returns (CompiledUnit, SymbolTable, stats); seconds are summed over workers
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or source.count('\n') + 1 < PARALLEL_MIN_LINES:
+        parser = Parser()
+        unit = compile_unit(Chunk(1, [source], False), parser)
+        if not with_tokens:
+            unit.tokens = []
+        return unit, parser.symbol_table, parser.stats()
+    results = compile_chunks(split_units(source), jobs, with_tokens)
+    stats = new_stats()
+    for _, unit_stats in results:
+        add_stats(stats, unit_stats)
+    with timed(stats['seconds'], 'ir'):
+        unit, table = merge_units([unit for unit, _ in results])
+    stats['instructions'] = len(unit.code)
+    stats['symbols'] = len(table)
+    return unit, table, stats
+
+
+def compile_source(source, jobs=None):
+    # Returns (IRBuffer, stats) like a serial compile followed by validate_main
+    unit, _, stats = compile_parallel(source, jobs, with_tokens=False)
+    if not unit.main_found:
+        raise SyntaxError("Program must start with a 'main' function.")
+    return unit.code, stats
@@ -1,19 +1,62 @@
-import re
+from time import perf_counter
+
+from expression import contains_call, parse_expression, split_arguments, split_assignment
+from ir import IRBuffer
 from lexer import Lexer
+from sinks import open_sink
+from stats import PHASES, timed
+from symbols import SymbolTable
+
+BLOCK_KEYWORDS = frozenset(('if', 'while', 'for', 'else'))
+TYPE_KEYWORDS = frozenset(('int', 'float', 'char', 'void'))
+COMMUTATIVE = frozenset(('+', '*', '==', '!=', '&&', '||'))
+# Instructions that start or end a basic block
+BLOCK_BOUNDARY = frozenset(('func', 'label', 'goto', 'if', 'ifnot', 'return'))
 
 class Parser:
-    def __init__(self):
+    def __init__(self, trace=None):
         self.lexer = Lexer()
+        # Optional callable (e.g. print) receiving debug trace lines; the
+        # trace is only formatted when one is set
+        self.trace = trace
+        # While streaming: where finished functions go, and an optional
+        # function applied to each function's IR on the way
+        self.sink = None
+        self.transform = None
+        self.reset()
+
+    def reset(self):
+        # Clear all compilation state; the lexer is kept
         self.in_function = False
         self.main_found = False
-        self.symbol_table = {}
+        self.symbol_table = SymbolTable()
         self.block_stack = []
         self.temp_count = 0
         self.label_count = 0
-        self.intermediate_code = []
+        self.intermediate_code = IRBuffer()
+        self.line_number = 0
         self.current_function = None
         self.loop_stack = []
         self.pending_else = None  # Track pending else after an if
+        # Local value numbering: (op, a, b) -> temp already holding that value
+        # in the current basic block, plus the keys that read each name
+        self.value_numbers = {}
+        self.value_readers = {}
+        self.line_count = 0
+        self.token_count = 0
+        self.flushed = 0  # instructions already handed to the sink
+        self.timings = dict.fromkeys(PHASES, 0.0)
+
+    def emit(self, op, arg1=None, arg2=None, result=None, args=None):
+        self.intermediate_code.append(op, arg1, arg2, result, args)
+        if self.value_numbers:
+            if op in BLOCK_BOUNDARY:
+                self.value_numbers.clear()
+                self.value_readers.clear()
+            elif result in self.value_readers:
+                # The name was reassigned; values computed from it are stale
+                for key in self.value_readers.pop(result):
+                    self.value_numbers.pop(key, None)
 
     def new_temp(self):
         self.temp_count += 1
@@ -24,227 +67,295 @@ class Parser:
         return f"L{self.label_count}"
 
     def parse_line(self, line, line_number):
-        tokens = self.lexer.tokenize(line)
+        self.parse_tokens(self.lexer.tokenize(line, line_number), line_number)
+
+    def parse_lines(self, lines, tokens=None):
+        # Parses (line_number, tokens) pairs, timing how long producing them
+        # (lexing) and parsing them take; tokens are collected if given a list
+        timings = self.timings
+        accrued = sum(timings.values())
+        clock = perf_counter
+        lex_time = parse_time = 0.0
+        lines = iter(lines)
+        while True:
+            start = clock()
+            item = next(lines, None)
+            lexed = clock()
+            lex_time += lexed - start
+            if item is None:
+                break
+            if tokens is not None:
+                tokens.extend(item[1])
+            self.parse_tokens(item[1], item[0])
+            parse_time += clock() - lexed
+        # Time recorded by phases nested in parsing (ir, write, ...) is not parse time
+        nested = sum(timings.values()) - accrued
+        timings['lex'] += lex_time
+        timings['parse'] += parse_time - nested
+
+    def parse_source(self, source, line=1):
+        self.parse_lines(self.lexer.iter_lines(source, line))
+
+    def parse_stream(self, stream, sink, transform=None):
+        # Compiles an open text file in memory bounded by its largest
+        # function: each function's IR is written to sink as soon as the
+        # function closes and the symbol table keeps only visible scopes
+        self.reset()
+        self.symbol_table = SymbolTable(keep_history=False)
+        self.sink = sink
+        self.transform = transform
+        try:
+            self.parse_lines(self.lexer.iter_file(stream))
+            self.flush()
+        finally:
+            self.sink = None
+            self.transform = None
+
+    def flush(self):
+        # Hands the IR collected so far to the sink and starts a new buffer;
+        # temp and label numbering carry on. Instructions are counted as
+        # written, after the transform
+        code = self.intermediate_code
+        if not len(code):
+            return
+        self.intermediate_code = IRBuffer()
+        if self.transform is not None:
+            code = self.transform(code)
+        self.flushed += len(code)
+        with timed(self.timings, 'write'):
+            self.sink.write(code)
+
+    def stats(self):
+        return {
+            'lines': self.line_count,
+            'tokens': self.token_count,
+            'temps': self.temp_count,
+            'labels': self.label_count,
+            'instructions': self.flushed + len(self.intermediate_code),
+            'symbols': len(self.symbol_table),
+            'seconds': dict(self.timings),
+        }
+
+    def parse_tokens(self, tokens, line_number):
         if not tokens:
             return
 
-        if tokens[0][0] == 'PREPROCESSOR':
-            return
+        self.line_count += 1
+        self.token_count += len(tokens)
+        if self.trace is not None:
+            self.trace_tokens(tokens, line_number)
 
-        types = [t[0] for t in tokens]
-        values = [t[1] for t in tokens]
+        head_kind, head = tokens[0][0], tokens[0][1]
+        if head_kind == 'PREPROCESSOR':
+            return
+        self.line_number = line_number
+        if self.pending_else is not None and head != 'else':
+            self.close_if()
 
-        print(f"Line {line_number} Tokens:")
-        for token in tokens:
-            print(f"  {token[0]} -> {token[1]}")
+        # Statements are classified from fixed positions (head, second and
+        # tail tokens) instead of scanning the whole line for markers.
+        count = len(tokens)
+        second = tokens[1][1] if count > 1 else None
+        tail = tokens[-1][1]
 
         # Function start: e.g. int main() {
-        if (len(tokens) >= 5 and
-            tokens[0][0] == 'KEYWORD' and
+        if (count >= 5 and
+            head_kind == 'KEYWORD' and
             tokens[1][0] == 'IDENTIFIER' and
             tokens[2][1] == '(' and
-            ')' in values and
-            '{' in values):
+            tokens[-2][1] == ')' and
+            tail == '{'):
             self.in_function = True
+            # Control-flow state never carries over from the previous function
+            self.loop_stack = []
+            self.pending_else = None
             self.block_stack.append('function')
             self.current_function = tokens[1][1]
             if self.current_function == 'main':
                 self.main_found = True
-            self.symbol_table[self.current_function] = 'function'
-            self.intermediate_code.append(f"func {self.current_function}:")
+            function = self.symbol_table.declare(self.current_function, 'function', head, line_number)
+            self.symbol_table.enter_scope()
+            params = self.declare_parameters(tokens[3:-2], line_number)
+            self.emit('func', result=function.ir_name, args=params)
             return
 
         # Block start (if, else, while, for) with '{'
-        if tokens[0][1] in ('if', 'while', 'for', 'else') and '{' in values:
-            self.block_stack.append('block')
-
-            keyword = tokens[0][1]
+        if head in BLOCK_KEYWORDS and tail == '{':
+            keyword = head
+            self.symbol_table.enter_scope()
             if keyword == 'while':
                 # while condition block: generate loop labels and jumps
                 cond_start_label = self.new_label()
                 cond_true_label = self.new_label()
                 cond_end_label = self.new_label()
-                self.loop_stack.append((cond_start_label, cond_true_label, cond_end_label))
-                self.intermediate_code.append(f"{cond_start_label}:")
+                self.loop_stack.append(('while', cond_start_label, cond_end_label))
+                self.emit('label', result=cond_start_label)
                 cond_expr = self.extract_condition_expr(tokens)
                 cond_temp = self.generate_expression_code(cond_expr)
-                self.intermediate_code.append(f"if {cond_temp} goto {cond_true_label}")
-                self.intermediate_code.append(f"goto {cond_end_label}")
-                self.intermediate_code.append(f"{cond_true_label}:")
+                self.emit('if', cond_temp, result=cond_true_label)
+                self.emit('goto', result=cond_end_label)
+                self.emit('label', result=cond_true_label)
             elif keyword == 'for':
                 # For loop has init; cond; inc parts inside ()
                 cond_start_label = self.new_label()
                 cond_true_label = self.new_label()
                 cond_end_label = self.new_label()
-                self.loop_stack.append((cond_start_label, cond_true_label, cond_end_label))
                 # Parse for init; cond; inc separately
                 init_expr, cond_expr, inc_expr = self.extract_for_expr(tokens)
                 # Init code
                 if init_expr:
                     self.process_for_init(init_expr)
-                self.intermediate_code.append(f"{cond_start_label}:")
+                self.emit('label', result=cond_start_label)
                 # Condition code
-                cond_temp = self.generate_expression_code(cond_expr)
-                self.intermediate_code.append(f"if {cond_temp} goto {cond_true_label}")
-                self.intermediate_code.append(f"goto {cond_end_label}")
-                self.intermediate_code.append(f"{cond_true_label}:")
+                if cond_expr:
+                    cond_temp = self.generate_expression_code(cond_expr)
+                    self.emit('if', cond_temp, result=cond_true_label)
+                    self.emit('goto', result=cond_end_label)
+                self.emit('label', result=cond_true_label)
                 # Save inc_expr for later after block end
-                self.loop_stack[-1] += (inc_expr,)
+                self.loop_stack.append(('for', cond_start_label, cond_end_label, inc_expr))
             elif keyword == 'if':
                 # if condition block
                 cond_expr = self.extract_condition_expr(tokens)
                 cond_temp = self.generate_expression_code(cond_expr)
                 else_label = self.new_label()
                 end_label = self.new_label()
-                self.block_stack.append('block')
-                self.intermediate_code.append(f"if not {cond_temp} goto {else_label}")
-                self.pending_else = (else_label, end_label)  # Save for the else
-                self.loop_stack.append((else_label, end_label))  # Save for matching else
-
-
+                self.emit('ifnot', cond_temp, result=else_label)
+                self.loop_stack.append(('if', else_label, end_label))
             elif keyword == 'else':
-                if self.pending_else:
-                    else_label, end_label = self.pending_else
-                    self.intermediate_code.append(f"goto {end_label}")
-                    self.intermediate_code.append(f"{else_label}:")
-                    self.block_stack.append('block')
-                    self.loop_stack.append(('else', end_label))  # Mark the end label for this else
-                    self.pending_else = None
-                else:
+                if not self.pending_else:
                     raise SyntaxError(f"Syntax error at line {line_number}: unexpected 'else' without matching 'if'")
+                else_label, end_label = self.pending_else
+                self.pending_else = None
+                self.emit('goto', result=end_label)
+                self.emit('label', result=else_label)
+                self.loop_stack.append(('else', end_label))  # Mark the end label for this else
+            self.block_stack.append('block')
             return
 
         # Block end: '}'
-        if line.strip() == '}':
+        if count == 1 and head == '}':
             if not self.block_stack:
                 raise SyntaxError(f"Syntax error at line {line_number}: unmatched closing brace")
 
             last_block = self.block_stack.pop()
 
-            # Handle loop ends
             if last_block == 'function':
+                self.symbol_table.exit_scope()
                 self.in_function = False
                 self.current_function = None
+                if self.sink is not None:
+                    self.flush()
                 return
 
-            if last_block == 'block':
-                if self.pending_else:
-                    return
-                if not self.loop_stack:
-                    return
-                top = self.loop_stack[-1]
-                if len(top) == 3:  # while or for loop
-                    start_label, true_label, end_label = self.loop_stack.pop()
-                    # For 'for' loops, inc_expr is saved as 4th element
-                    inc_expr = None
-                    if len(top) == 4:
-                        inc_expr = top[3]
-                    # For loops: generate increment code then jump back to cond start
-                    if inc_expr:
-                        inc_code = self.generate_expression_code(inc_expr)
-                        self.intermediate_code.extend(inc_code)
-                    self.intermediate_code.append(f"goto {start_label}")
-                    self.intermediate_code.append(f"{end_label}:")
-                elif len(top) == 2:  # if block
-                    else_label, end_label = self.loop_stack.pop()
-                    self.intermediate_code.append(f"{end_label}:")
-                elif isinstance(top, tuple) and top[0] == 'else':
-                    end_label = top[1]
-                    self.loop_stack.pop()
-                    self.intermediate_code.append(f"{end_label}:")
-
-                return
-
-            # if last_block == 'if':
-            #     # We close if block without else
-            #     if self.pending_else:
-            #         else_label, end_label = self.pending_else
-            #         self.intermediate_code.append(f"{else_label}:")
-            #         self.intermediate_code.append(f"{end_label}:")
-            #         self.pending_else = None  
-            #     return
+            top = self.loop_stack.pop()
+            kind = top[0]
+            if kind == 'while':
+                self.emit('goto', result=top[1])
+                self.emit('label', result=top[2])
+            elif kind == 'for':
+                # For loops: generate increment code then jump back to cond start
+                if top[3]:
+                    self.process_for_step(top[3])
+                self.emit('goto', result=top[1])
+                self.emit('label', result=top[2])
+            elif kind == 'if':
+                # The else label is placed once we know whether an else follows
+                self.pending_else = (top[1], top[2])
+            else:
+                self.emit('label', result=top[1])
+            self.symbol_table.exit_scope()
+            return
 
         if not self.in_function or not self.block_stack:
             raise SyntaxError(f"Syntax error at line {line_number}: Not inside function block")
 
-        # Variable declaration with initialization
-        if tokens[0][0] == 'KEYWORD' and 'IDENTIFIER' in types and '=' in values and tokens[-1][1] == ';':
-            var_name = tokens[1][1]
-            self.symbol_table[var_name] = 'variable'
-            rhs_expr = [v for t, v in tokens[3:-1]]
-            expr_temp = self.generate_expression_code(rhs_expr)
-            self.intermediate_code.extend(expr_temp[1:])
-            self.intermediate_code.append(f"{var_name} = {expr_temp[0]}")
-            return
+        if tail == ';' and count >= 3:
+            second_kind = tokens[1][0]
+
+            # Only 'type name;' and 'type name = expr;' are declarations
+            if head in TYPE_KEYWORDS and second_kind == 'IDENTIFIER':
+                rest = split_assignment([t[1] for t in tokens[2:-1]])
+                if rest and (rest[0] != '=' or len(rest) == 1):
+                    raise SyntaxError(f"Syntax error at line {line_number}: {' '.join(t[1] for t in tokens)}")
+                symbol = self.symbol_table.declare(tokens[1][1], 'variable', head, line_number)
+                # Variable declaration with initialization
+                if rest:
+                    self.emit('copy', self.generate_expression_code(rest[1:]), result=symbol.ir_name)
+                # Variable declaration without initialization
+                return
 
-        # Variable declaration without initialization
-        if tokens[0][0] == 'KEYWORD' and 'IDENTIFIER' in types and tokens[-1][1] == ';':
-            var_name = tokens[1][1]
-            self.symbol_table[var_name] = 'variable'
-            return
+            # Assignment statement
+            if head_kind == 'IDENTIFIER':
+                rest = split_assignment([t[1] for t in tokens[1:-1]])
+                if rest[0] == '=':
+                    target = self.symbol_table.use(head)
+                    self.emit('copy', self.generate_expression_code(rest[1:]), result=target)
+                    return
 
-        # Assignment statement
-        if tokens[0][0] == 'IDENTIFIER' and '=' in values and tokens[-1][1] == ';':
-            var_name = tokens[0][1]
-            rhs_expr = [v for t, v in tokens[2:-1]]
-            expr_temp = self.generate_expression_code(rhs_expr)
-            self.intermediate_code.extend(expr_temp[1:])
-            self.intermediate_code.append(f"{var_name} = {expr_temp[0]}")
-            return
+            # Return statement
+            if head == 'return':
+                ret_expr = [t[1] for t in tokens[1:-1]]
+                self.emit('return', self.generate_expression_code(ret_expr))
+                return
 
-        # Return statement
-        if tokens[0][1] == 'return' and tokens[-1][1] == ';':
-            if len(tokens) > 2:
-                ret_expr = [v for t, v in tokens[1:-1]]
-                expr_temp = self.generate_expression_code(ret_expr)
-                self.intermediate_code.extend(expr_temp[1:])
-                self.intermediate_code.append(f"return {expr_temp[0]}")
-            else:
-                self.intermediate_code.append("return")
-            return
+            if second == '(' and tokens[-2][1] == ')' and count >= 4:
+                # Function call statement
+                if head_kind == 'IDENTIFIER':
+                    function = self.symbol_table.use(head)
+                    args = self.generate_arguments([t[1] for t in tokens[2:-2]])
+                    self.emit('call', function, result=self.new_temp(), args=args)
+                    return
 
-        # Function call statement
-        if (tokens[0][0] == 'IDENTIFIER' and tokens[1][1] == '(' and ')' in values and tokens[-1][1] == ';'):
-            func_name = tokens[0][1]
-            args = [v for t, v in tokens[2:-2] if v != ',']
-            temp = self.new_temp()
-            arg_str = ', '.join(args)
-            self.intermediate_code.append(f"{temp} = call {func_name}({arg_str})")
-            return
+                # Print statement
+                if head == 'print':
+                    args = self.generate_arguments([t[1] for t in tokens[2:-2]])
+                    self.emit('print', args=args)
+                    return
 
-        # Print statement
-        if (tokens[0][1] == 'print' and tokens[1][1] == '(' and ')' in values and tokens[-1][1] == ';'):
-            args = [v for t, v in tokens[2:-2] if v != ',']
-            self.intermediate_code.append(f"print({', '.join(args)})")
+        # Bare return statement
+        if count == 2 and head == 'return' and tail == ';':
+            self.emit('return')
             return
 
-        raise SyntaxError(f"Syntax error at line {line_number}: {line.strip()}")
+        raise SyntaxError(f"Syntax error at line {line_number}: {' '.join(t[1] for t in tokens)}")
+
+    def trace_tokens(self, tokens, line_number):
+        self.trace(f"Line {line_number} Tokens:\n" +
+                   '\n'.join(f"  {token[0]} -> {token[1]}" for token in tokens))
+
+    def close_if(self):
+        # An if block without else ends at its else label
+        else_label, end_label = self.pending_else
+        self.pending_else = None
+        self.emit('label', result=else_label)
 
     def extract_condition_expr(self, tokens):
-        # Extract tokens inside first pair of ()
+        # Extract tokens inside the first pair of () and its nested pairs
         start = None
-        end = None
-        for i, (t, v) in enumerate(tokens):
-            if v == '(':
+        for i, token in enumerate(tokens):
+            if token[1] == '(':
                 start = i + 1
                 break
         if start is None:
             return []
+        depth = 1
         for j in range(start, len(tokens)):
-            if tokens[j][1] == ')':
-                end = j
-                break
-        if end is None:
-            return []
-        expr = [tokens[i][1] for i in range(start, end)]
-        return expr
+            value = tokens[j][1]
+            if value == '(':
+                depth += 1
+            elif value == ')':
+                depth -= 1
+                if depth == 0:
+                    return [tokens[i][1] for i in range(start, j)]
+        return []
 
     def extract_for_expr(self, tokens):
         # Extract init; cond; inc from for(...) tokens
         start = None
         end = None
-        for i, (t, v) in enumerate(tokens):
-            if v == '(':
+        for i, token in enumerate(tokens):
+            if token[1] == '(':
                 start = i + 1
                 break
         for j in range(len(tokens)-1, -1, -1):
@@ -255,75 +366,125 @@ class Parser:
             return [], [], []
 
         inner_tokens = tokens[start:end]
-        semicolon_indices = [i for i, (t,v) in enumerate(inner_tokens) if v == ';']
+        semicolon_indices = [i for i, token in enumerate(inner_tokens) if token[1] == ';']
 
         if len(semicolon_indices) != 2:
             return [], [], []
 
-        init = [v for t,v in inner_tokens[:semicolon_indices[0]]]
-        cond = [v for t,v in inner_tokens[semicolon_indices[0]+1:semicolon_indices[1]]]
-        inc = [v for t,v in inner_tokens[semicolon_indices[1]+1:]]
+        init = [t[1] for t in inner_tokens[:semicolon_indices[0]]]
+        cond = [t[1] for t in inner_tokens[semicolon_indices[0]+1:semicolon_indices[1]]]
+        inc = [t[1] for t in inner_tokens[semicolon_indices[1]+1:]]
 
         return init, cond, inc
 
+    def declare_parameters(self, tokens, line_number):
+        # Parameters are 'type name' pairs separated by commas
+        params = []
+        for param in split_arguments([t[1] for t in tokens]):
+            if param == ['void'] and not params:
+                continue
+            if len(param) != 2 or param[0] not in TYPE_KEYWORDS:
+                raise SyntaxError(f"Syntax error at line {line_number}: bad parameter '{' '.join(param)}'")
+            params.append(self.symbol_table.declare(param[1], 'parameter', param[0], line_number).ir_name)
+        return params
+
     def process_for_init(self, init_expr):
         if not init_expr:
             return
         # For simplicity, only support assignment or declaration with init
         # e.g. int i = 0 or i = 0
+        if init_expr[0] == 'int':
+            init_expr = init_expr[:2] + split_assignment(init_expr[2:])
+        else:
+            init_expr = init_expr[:1] + split_assignment(init_expr[1:])
         if init_expr[0] == 'int' and len(init_expr) > 2 and init_expr[2] == '=':
-            var_name = init_expr[1]
-            self.symbol_table[var_name] = 'variable'
+            symbol = self.symbol_table.declare(init_expr[1], 'variable', 'int', self.line_number)
             rhs_expr = init_expr[3:]
-            expr_temp = self.generate_expression_code(rhs_expr)
-            self.intermediate_code.extend(expr_temp[1:])
-            self.intermediate_code.append(f"{var_name} = {expr_temp[0]}")
+            self.emit('copy', self.generate_expression_code(rhs_expr), result=symbol.ir_name)
         elif '=' in init_expr:
             eq_idx = init_expr.index('=')
-            var_name = init_expr[0]
+            var_name = self.symbol_table.use(init_expr[0])
             rhs_expr = init_expr[eq_idx+1:]
-            expr_temp = self.generate_expression_code(rhs_expr)
-            self.intermediate_code.extend(expr_temp[1:])
-            self.intermediate_code.append(f"{var_name} = {expr_temp[0]}")
+            self.emit('copy', self.generate_expression_code(rhs_expr), result=var_name)
+
+    def process_for_step(self, inc_expr):
+        # Supports i++, i--, ++i, --i, i += e, i -= e and i = e
+        if inc_expr[0] not in ('++', '--'):
+            inc_expr = inc_expr[:1] + split_assignment(inc_expr[1:])
+        var_name = self.symbol_table.use(inc_expr[1] if inc_expr[0] in ('++', '--') else inc_expr[0])
+        if len(inc_expr) == 2 and inc_expr[1] in ('++', '--'):
+            op = inc_expr[1][0]
+            self.emit(op, var_name, '1', var_name)
+        elif len(inc_expr) == 2 and inc_expr[0] in ('++', '--'):
+            op = inc_expr[0][0]
+            self.emit(op, var_name, '1', var_name)
+        elif len(inc_expr) > 2 and inc_expr[1] in ('+=', '-=', '*=', '/=', '%='):
+            op = inc_expr[1][0]
+            self.emit(op, var_name, self.generate_expression_code(inc_expr[2:]), var_name)
+        elif len(inc_expr) > 2 and inc_expr[1] == '=':
+            self.emit('copy', self.generate_expression_code(inc_expr[2:]), result=var_name)
+        else:
+            raise SyntaxError(f"Syntax error at line {self.line_number}: unsupported for-loop step {' '.join(inc_expr)}")
 
     def generate_expression_code(self, expr):
-        # Very basic left-to-right parsing without operator precedence
-        # returns list of instructions, last temp holding expression result is first element
+        # Parses with operator precedence and emits the instructions;
+        # returns the operand holding the result
         if not expr:
-            return []
-
-        code = []
-        stack = []
-
-        def is_operator(c):
-            return c in ('+', '-', '*', '/', '<', '>', '<=', '>=', '==', '!=', '%')
-
-        i = 0
-        while i < len(expr):
-            token = expr[i]
-            if token.isdigit() or re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', token):
-                stack.append(token)
-                i += 1
-            elif is_operator(token):
-                # binary op, pop left, take right from next token
-                left = stack.pop()
-                op = token
-                right = expr[i+1]
-                temp = self.new_temp()
-                code.append(f"{temp} = {left} {op} {right}")
-                stack.append(temp)
-                i += 2
-            else:
-                # If token is '(' or ')' or unknown, just skip for now
-                i += 1
-
-        if len(stack) == 1:
-            return [stack[0]] + code
-        else:
-            # fallback join expression as is
+            raise SyntaxError(f"Syntax error at line {self.line_number}: missing expression")
+        node = parse_expression(expr, self.line_number)
+        start = perf_counter()
+        operand = self.lower(node)
+        self.timings['ir'] += perf_counter() - start
+        return operand
+
+    def generate_arguments(self, values):
+        return [self.generate_expression_code(arg) for arg in split_arguments(values)]
+
+    def lower(self, node):
+        kind = node[0]
+        if kind == 'operand':
+            value = node[1]
+            if value[0].isalpha() or value[0] == '_':
+                return self.symbol_table.use(value)
+            return value
+        if kind == 'call':
+            function = self.symbol_table.use(node[1])
+            args = [self.lower(arg) for arg in node[2]]
             temp = self.new_temp()
-            code.append(f"{temp} = {' '.join(expr)}")
-            return [temp] + code
+            self.emit('call', function, result=temp, args=args)
+            return temp
+        if kind == 'unary':
+            return self.value_number(node[1], self.lower(node[2]), None)
+        op = node[1]
+        if op in ('&&', '||') and contains_call(node[3]):
+            return self.lower_short_circuit(op, node[2], node[3])
+        return self.value_number(op, self.lower(node[2]), self.lower(node[3]))
+
+    def value_number(self, op, a, b):
+        # Reuse the temp of an identical computation earlier in the block
+        key = (op, b, a) if op in COMMUTATIVE and b < a else (op, a, b)
+        temp = self.value_numbers.get(key)
+        if temp is not None:
+            return temp
+        temp = self.new_temp()
+        self.emit(op, a, b, temp)
+        self.value_numbers[key] = temp
+        readers = self.value_readers
+        for name in (a, b):
+            if name is not None:
+                readers.setdefault(name, []).append(key)
+        return temp
+
+    def lower_short_circuit(self, op, left, right):
+        # The right operand has a call, so it is only evaluated when needed:
+        #   t = left != 0; if not t goto Lskip; t = right != 0; Lskip:   (&&)
+        result = self.new_temp()
+        skip_label = self.new_label()
+        self.emit('!=', self.lower(left), '0', result)
+        self.emit('ifnot' if op == '&&' else 'if', result, result=skip_label)
+        self.emit('!=', self.lower(right), '0', result)
+        self.emit('label', result=skip_label)
+        return result
 
     def validate_main(self):
         if not self.main_found:
@@ -331,11 +492,18 @@ class Parser:
 
     def display_symbol_table(self):
         print("\nSymbol Table:")
-        for symbol, kind in self.symbol_table.items():
-            print(f"  {symbol} -> {kind}")
-
-    def write_intermediate_code(self):
-        with open("intermediate_code.txt", "w") as f:
-            for line in self.intermediate_code:
-                f.write(line + "\n")
-        print("\nIntermediate code written to 'intermediate_code.txt'")
+        for symbol in self.symbol_table:
+            print(f"  {symbol.name} -> {symbol.kind} ({symbol.type}, scope {symbol.scope}, "
+                  f"line {symbol.line}, {symbol.uses} uses)")
+
+    def write_intermediate_code(self, target="intermediate_code.txt", code=None):
+        # target is a path ('.irb' for binary IR), '-' for stdout, None for
+        # an in-memory sink, or a sink; the sink is returned
+        code = self.intermediate_code if code is None else code
+        with timed(self.timings, 'write'):
+            sink = open_sink(target)
+            with sink:
+                sink.write(code)
+        if self.trace is not None:
+            self.trace(f"Intermediate code written to {target!r}")
+        return sink
@@ -0,0 +1,232 @@
+import sys
+
+from ir import IRBuffer, OPCODES
+
+# Destinations for generated intermediate code. A sink accepts one or more
+# IRBuffers through write() (each is appended to what was written before)
+# and is finished with close(); sinks are also context managers.
+#   MemorySink       keeps the IR in memory, nothing touches the disk
+#   TextSink         text form on an already open stream (e.g. sys.stdout)
+#   FileSink         text form to a caller-chosen path, written in batches
+#   BinarySink       compact binary form (see below) to a path
+#
+# Binary layout: the magic b'IRB1' followed by one block per write():
+#   varint string count, then each string as varint byte length + UTF-8
+#   varint instruction count, then per instruction
+#     opcode byte (bit 7 set when an argument list follows)
+#     arg1, arg2, result as zigzag varints of the operand ids
+#     [varint argument count, zigzag varint ids]
+# Operand ids index the block's string table, exactly as in IRBuffer.
+
+MAGIC = b'IRB1'
+WRITE_BATCH = 4096  # text lines joined per write call
+HAS_ARGS = 0x80
+
+
+class Sink:
+    def write(self, code):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemorySink(Sink):
+    def __init__(self):
+        self.code = IRBuffer()
+        self.owned = True  # False while self.code is the caller's buffer
+
+    def write(self, code):
+        # The first buffer is kept as is; it is copied before anything is
+        # appended so the caller's buffer is never modified
+        if self.owned and not len(self.code):
+            self.code = code
+            self.owned = False
+            return
+        if not self.owned:
+            copy = IRBuffer()
+            copy.extend(self.code)
+            self.code = copy
+            self.owned = True
+        self.code.extend(code)
+
+    def text(self):
+        return '\n'.join(self.code.lines())
+
+
+class TextSink(Sink):
+    def __init__(self, stream=None):
+        self.stream = sys.stdout if stream is None else stream
+
+    def write(self, code):
+        write_text(self.stream, code)
+
+    def close(self):
+        self.stream.flush()
+
+
+class FileSink(TextSink):
+    def __init__(self, path, buffering=1 << 16):
+        self.path = path
+        super().__init__(open(path, 'w', buffering=buffering))
+
+    def close(self):
+        self.stream.close()
+
+
+class BinarySink(Sink):
+    def __init__(self, path):
+        self.path = path
+        self.stream = open(path, 'wb')
+        self.stream.write(MAGIC)
+
+    def write(self, code):
+        self.stream.write(encode_block(code))
+
+    def close(self):
+        self.stream.close()
+
+
+def open_sink(target=None, binary=None):
+    # None -> memory, '-' -> stdout, a path -> text file unless it ends in
+    # .irb (or binary=True); an existing sink is returned unchanged
+    if isinstance(target, Sink):
+        return target
+    if target is None:
+        return MemorySink()
+    if target == '-':
+        return TextSink()
+    if binary or (binary is None and target.endswith('.irb')):
+        return BinarySink(target)
+    return FileSink(target)
+
+
+def write_text(stream, code):
+    batch = []
+    for line in code.lines():
+        batch.append(line)
+        if len(batch) == WRITE_BATCH:
+            batch.append('')
+            stream.write('\n'.join(batch))
+            batch = []
+    if batch:
+        batch.append('')
+        stream.write('\n'.join(batch))
+
+
+def put_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_block(code):
+    out = bytearray()
+    put_varint(out, len(code.operands))
+    for value in code.operands:
+        data = value.encode()
+        put_varint(out, len(data))
+        out += data
+
+    put_varint(out, len(code))
+    extra = code.extra
+    for index, (op, a, b, r) in enumerate(zip(code.ops, code.arg1, code.arg2, code.result)):
+        args = extra.get(index)
+        out.append(op | HAS_ARGS if args is not None else op)
+        for value in (a, b, r):
+            # zigzag: small negative ids (None, temps) stay one byte
+            value = value << 1 if value >= 0 else (-value << 1) - 1
+            if value < 0x80:
+                out.append(value)
+            else:
+                put_varint(out, value)
+        if args is not None:
+            put_varint(out, len(args))
+            for value in args:
+                put_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+    return bytes(out)
+
+
+def encode_ir(code):
+    return MAGIC + encode_block(code)
+
+
+def decode_ir(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a binary IR file")
+    pos = len(MAGIC)
+    end = len(data)
+
+    def varint():
+        nonlocal pos
+        value = data[pos]
+        pos += 1
+        if value < 0x80:
+            return value
+        value &= 0x7f
+        shift = 7
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def operand_id():
+        value = varint()
+        return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+    def read_block():
+        nonlocal pos
+        block = IRBuffer()
+        operands = block.operands
+        for _ in range(varint()):
+            size = varint()
+            value = data[pos:pos + size].decode()
+            block.operand_ids[value] = len(operands)
+            operands.append(value)
+            pos += size
+        count = varint()
+        ops, arg1, arg2, result = block.ops, block.arg1, block.arg2, block.result
+        for index in range(count):
+            op = data[pos]
+            pos += 1
+            if op & HAS_ARGS:
+                op &= ~HAS_ARGS
+                has_args = True
+            else:
+                has_args = False
+            if op >= len(OPCODES):
+                raise ValueError(f"bad opcode {op} in binary IR")
+            ops.append(op)
+            arg1.append(operand_id())
+            arg2.append(operand_id())
+            result.append(operand_id())
+            if has_args:
+                block.extra[index] = tuple(operand_id() for _ in range(varint()))
+        return block
+
+    code = None
+    try:
+        while pos < end:
+            block = read_block()
+            if code is None:
+                code = block
+            else:
+                code.extend(block)
+    except IndexError:
+        raise ValueError("truncated binary IR") from None
+    return code if code is not None else IRBuffer()
+
+
+def load_ir(path):
+    with open(path, 'rb') as f:
+        return decode_ir(f.read())
@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+# Compilation statistics are plain dicts so they can be summed across units
+# and returned from worker processes:
+#   {'lines': .., 'tokens': .., 'temps': .., 'labels': .., 'instructions': ..,
+#    'symbols': .., 'seconds': {'lex': .., 'parse': .., 'ir': .., 'write': ..}}
+# 'parse' excludes the time spent lowering expressions, which is 'ir'.
+
+PHASES = ('lex', 'parse', 'ir', 'write')
+COUNTERS = ('lines', 'tokens', 'temps', 'labels', 'instructions', 'symbols')
+
+
+def new_stats():
+    stats = dict.fromkeys(COUNTERS, 0)
+    stats['seconds'] = dict.fromkeys(PHASES, 0.0)
+    return stats
+
+
+@contextmanager
+def timed(seconds, phase):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        seconds[phase] = seconds.get(phase, 0.0) + perf_counter() - start
+
+
+def add_stats(total, stats):
+    for name in COUNTERS:
+        total[name] += stats.get(name, 0)
+    seconds = total['seconds']
+    for phase, value in stats['seconds'].items():
+        seconds[phase] = seconds.get(phase, 0.0) + value
+    return total
+
+
+def format_stats(stats):
+    lines = [f"{stats['lines']} lines, {stats['tokens']} tokens, {stats['symbols']} symbols",
+             f"{stats['instructions']} instructions, {stats['temps']} temps, {stats['labels']} labels"]
+    seconds = stats['seconds']
+    total = sum(seconds.values())
+    for phase, value in seconds.items():
+        share = f" ({value / total * 100:4.1f}%)" if total else ""
+        lines.append(f"  {phase:<9}{value * 1000:9.2f} ms{share}")
+    lines.append(f"  {'total':<9}{total * 1000:9.2f} ms")
+    return '\n'.join(lines)
@@ -0,0 +1,135 @@
+import sys
+
+from ir import is_generated
+
+# Scoped symbol table. Each scope is a hash map of the names declared in it;
+# a separate map from every name to its innermost visible declaration keeps
+# lookups constant-time however deep the nesting. Entering a scope pushes a
+# map, leaving it pops the map and restores whatever the scope's names
+# shadowed.
+#
+# Every declaration also has the name the IR uses for it. It is the source
+# name unless the declaration shadows a variable of an enclosing scope or
+# the name is spelled like a compiler temp or label (t<n>, L<n>); then the
+# scope depth is appended ("x.2", "t1.1"). Declarations visible at the same
+# time differ in depth, so their IR names differ, and since identifiers
+# cannot contain '.' only generated names ever look like temps or labels.
+
+
+class Symbol:
+    __slots__ = ('name', 'kind', 'type', 'scope', 'line', 'uses', 'ir_name', 'shadowed')
+
+    def __init__(self, name, kind, type, scope, line, uses=0, ir_name=None):
+        self.name = name
+        self.kind = kind
+        self.type = type
+        self.scope = scope
+        self.line = line
+        self.uses = uses
+        self.ir_name = ir_name or name
+        self.shadowed = None  # outer declaration hidden by this one
+
+    def __repr__(self):
+        return (f"Symbol({self.name!r}, {self.kind!r}, {self.type!r}, scope={self.scope}, "
+                f"line={self.line}, uses={self.uses})")
+
+    def moved(self, delta):
+        # Copy of the entry with its declaration line shifted
+        return Symbol(self.name, self.kind, self.type, self.scope, self.line + delta, self.uses, self.ir_name)
+
+
+def ir_name(name, scope):
+    return f"{name}.{scope}" if is_generated(name) else name
+
+
+class SymbolTable:
+    def __init__(self, keep_history=True):
+        self.scopes = [{}]   # scope 0 holds functions
+        self.visible = {}    # name -> innermost visible Symbol
+        self.forward = {}    # uses of functions not declared yet
+        self.keep_history = keep_history
+        self.symbols = []    # every declaration in order, for display
+        self.declared = 0    # declarations so far, kept even without history
+
+    @property
+    def depth(self):
+        return len(self.scopes) - 1
+
+    def enter_scope(self):
+        self.scopes.append({})
+
+    def exit_scope(self):
+        if len(self.scopes) == 1:
+            return
+        for name, symbol in self.scopes.pop().items():
+            if symbol.shadowed is None:
+                del self.visible[name]
+            else:
+                self.visible[name] = symbol.shadowed
+
+    def declare(self, name, kind, type, line):
+        scope = self.scopes[-1]
+        if name in scope:
+            raise SyntaxError(f"Syntax error at line {line}: redeclaration of '{name}'")
+        name = sys.intern(name)
+        depth = len(self.scopes) - 1
+        shadowed = self.visible.get(name)
+        if shadowed is not None and shadowed.scope > 0:
+            symbol = Symbol(name, kind, type, depth, line, ir_name=f"{name}.{depth}")
+        else:
+            symbol = Symbol(name, kind, type, depth, line, ir_name=ir_name(name, depth))
+        if len(self.scopes) == 1:
+            symbol.uses = self.forward.pop(name, 0)
+        symbol.shadowed = shadowed
+        scope[name] = symbol
+        self.visible[name] = symbol
+        self.declared += 1
+        if self.keep_history:
+            self.symbols.append(symbol)
+        return symbol
+
+    def lookup(self, name):
+        return self.visible.get(name)
+
+    def use(self, name):
+        # Counts a use; returns the IR name of the visible declaration
+        symbol = self.visible.get(name)
+        if symbol is not None:
+            symbol.uses += 1
+            return symbol.ir_name
+        self.forward[name] = self.forward.get(name, 0) + 1
+        # Not declared (yet): functions are declared at scope 0
+        return ir_name(name, 0)
+
+    def add_symbols(self, symbols, forward=None, delta=0):
+        # Adopts entries compiled elsewhere (another unit or worker process),
+        # shifting their lines by delta. Functions are copied because their
+        # use counts pick up calls made from other units.
+        for symbol in symbols:
+            if delta or symbol.scope == 0:
+                symbol = symbol.moved(delta)
+            if symbol.scope == 0:
+                if symbol.name in self.scopes[0]:
+                    raise SyntaxError(f"Syntax error at line {symbol.line}: redeclaration of '{symbol.name}'")
+                symbol.uses += self.forward.pop(symbol.name, 0)
+                self.scopes[0][symbol.name] = symbol
+                self.visible[symbol.name] = symbol
+            self.declared += 1
+            if self.keep_history:
+                self.symbols.append(symbol)
+        if forward:
+            for name, count in forward.items():
+                symbol = self.scopes[0].get(name)
+                if symbol is not None:
+                    symbol.uses += count
+                else:
+                    self.forward[name] = self.forward.get(name, 0) + count
+
+    def __contains__(self, name):
+        return name in self.visible
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __len__(self):
+        return self.declared
@@ -0,0 +1,198 @@
+import marshal
+import os
+
+from lexer import Lexer, Token
+
+# Table-driven alternative to the regex lexer. The tables are generated from
+# Lexer.TOKEN_SPECIFICATION by probing every ASCII character against the
+# spec patterns: START maps a character code to the token kind it can begin,
+# and runs of that kind are then scanned once. Keywords are not matched as
+# alternatives; a scanned identifier is classified with a perfect hash on
+# (length, first character) followed by one string comparison.
+#
+# The regex spec relies on \b, which is Unicode-aware, so sources with
+# non-ASCII characters are handed to the regex engine instead.
+#
+# `python table_lexer.py` saves the tables to TABLE_FILE; later processes
+# load them from there instead of probing the patterns again. The file is
+# ignored if it was built from a different specification.
+
+IDENT, NUMBER, OPERATOR, DELIMITER, SKIP, STRING, PREPROCESSOR = range(7)
+WORD_CHARS = frozenset('_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+HASH_WIDTH = 128
+TABLE_FORMAT = 1
+TABLE_FILE = os.environ.get('LEXER_TABLES',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lexer_tables.marshal'))
+
+shared_tables = None
+
+
+def build_tables(specification=Lexer.TOKEN_SPECIFICATION):
+    # Returns (start, runs, formats, keywords): the kind each ASCII code can
+    # begin, the characters that continue a run of each kind, the letters
+    # that turn "%" into a FORMAT token and the keyword hash table
+    import re  # only needed when the tables are not saved
+    patterns = {name: re.compile(pattern) for name, pattern in specification}
+
+    def chars(name, prefix=''):
+        return ''.join(chr(code) for code in range(1, 128) if patterns[name].fullmatch(prefix + chr(code)))
+
+    start = [None] * 128
+    runs = {}
+    for kind, name in ((IDENT, 'IDENTIFIER'), (NUMBER, 'NUMBER'), (OPERATOR, 'OPERATOR'),
+                       (DELIMITER, 'DELIMITER'), (SKIP, 'SKIP')):
+        first = chars(name)
+        for char in first:
+            start[ord(char)] = kind
+        if kind != DELIMITER:
+            runs[kind] = chars(name, first[0])
+    start[ord('"')] = STRING
+    start[ord('#')] = PREPROCESSOR
+    formats = chars('FORMAT', '%')
+
+    keywords = re.search(r'\((.*)\)', dict(specification)['KEYWORD']).group(1).split('|')
+    table = [None] * (HASH_WIDTH * (max(map(len, keywords)) + 1))
+    for word in keywords:
+        slot = len(word) * HASH_WIDTH + ord(word[0])
+        if table[slot] is not None:
+            raise ValueError(f"keywords {table[slot]!r} and {word!r} collide in the keyword hash")
+        table[slot] = word
+    return start, runs, formats, table
+
+
+def save_tables(path=TABLE_FILE, specification=Lexer.TOKEN_SPECIFICATION):
+    data = marshal.dumps((TABLE_FORMAT, repr(specification), build_tables(specification)))
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def load_tables(path=TABLE_FILE, specification=Lexer.TOKEN_SPECIFICATION):
+    # Tables written by save_tables(), or None if missing, unreadable or stale
+    try:
+        with open(path, 'rb') as f:
+            version, key, tables = marshal.loads(f.read())
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    if version != TABLE_FORMAT or key != repr(specification):
+        return None
+    return tables
+
+
+def default_tables():
+    global shared_tables
+    if shared_tables is None:
+        shared_tables = load_tables() or build_tables()
+    return shared_tables
+
+
+class TableLexer:
+    def __init__(self, tables=None):
+        self.start, runs, self.formats, self.keywords = tables or default_tables()
+        self.regex = None  # for non-ASCII sources; created when one shows up
+        self.ident_chars = frozenset(runs[IDENT])
+        self.digit_chars = frozenset(runs[NUMBER])
+        self.operator_chars = frozenset(runs[OPERATOR])
+        self.skip_chars = frozenset(runs[SKIP])
+
+    def iter_lines(self, source, line=1):
+        if not source.isascii():
+            if self.regex is None:
+                self.regex = Lexer(engine='regex')
+            yield from self.regex.iter_lines(source, line)
+            return
+        scan = self.scan_line
+        for text in source.split('\n'):
+            if text:
+                tokens = scan(text, line)
+                if tokens:
+                    yield line, tokens
+            line += 1
+
+    def iter_tokens(self, source, line=1):
+        for _, tokens in self.iter_lines(source, line):
+            yield from tokens
+
+    def scan_line(self, text, line):
+        start = self.start
+        keywords = self.keywords
+        limit = len(keywords)
+        ident_chars = self.ident_chars
+        digit_chars = self.digit_chars
+        skip_chars = self.skip_chars
+        operator_chars = self.operator_chars
+        tokens = []
+        append = tokens.append
+        length = len(text)
+        pos = 0
+        while pos < length:
+            char = text[pos]
+            code = ord(char)
+            kind = start[code]
+            if kind == SKIP:
+                pos += 1
+                while pos < length and text[pos] in skip_chars:
+                    pos += 1
+                continue
+            if kind == IDENT:
+                end = pos + 1
+                while end < length and text[end] in ident_chars:
+                    end += 1
+                word = text[pos:end]
+                slot = (end - pos) * HASH_WIDTH + code
+                append(Token('KEYWORD' if slot < limit and keywords[slot] == word else 'IDENTIFIER',
+                             word, line, pos + 1))
+                pos = end
+            elif kind == DELIMITER:
+                append(Token('DELIMITER', char, line, pos + 1))
+                pos += 1
+            elif kind == NUMBER:
+                end = pos + 1
+                while end < length and text[end] in digit_chars:
+                    end += 1
+                if end + 1 < length and text[end] == '.' and text[end + 1] in '0123456789':
+                    fraction = end + 2
+                    while fraction < length and text[fraction] in digit_chars:
+                        fraction += 1
+                    if fraction >= length or text[fraction] not in WORD_CHARS:
+                        end = fraction
+                if end < length and text[end] in WORD_CHARS:
+                    # No word boundary after the digits: the regex spec
+                    # rejects the first digit
+                    self.illegal(char, line, pos)
+                append(Token('NUMBER', text[pos:end], line, pos + 1))
+                pos = end
+            elif kind == OPERATOR:
+                if char == '%' and pos + 1 < length and text[pos + 1] in self.formats:
+                    end = pos + 2
+                    if end < length and text[end] in WORD_CHARS:
+                        # \b cannot hold before a word character after a format
+                        self.illegal(text[end], line, end)
+                    append(Token('FORMAT', text[pos:end], line, pos + 1))
+                else:
+                    end = pos + 1
+                    while end < length and text[end] in operator_chars:
+                        end += 1
+                    append(Token('OPERATOR', text[pos:end], line, pos + 1))
+                pos = end
+            elif kind == STRING:
+                end = text.find('"', pos + 1)
+                if end < 0:
+                    self.illegal(char, line, pos)
+                append(Token('STRING', text[pos:end + 1], line, pos + 1))
+                pos = end + 1
+            elif kind == PREPROCESSOR:
+                append(Token('PREPROCESSOR', text[pos:], line, pos + 1))
+                break
+            else:
+                self.illegal(char, line, pos)
+        return tokens
+
+    def illegal(self, value, line, pos):
+        raise SyntaxError(f'Illegal token: {value} at line {line}, column {pos + 1}')
+
+
+if __name__ == "__main__":
+    save_tables()
+    print(f"Lexer tables written to {TABLE_FILE}")
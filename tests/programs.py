@@ -0,0 +1,55 @@
+import glob
+import os
+
+from benchmark import generate_program
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Identifiers spelled like compiler temps and labels
+GENERATED_NAMES = """\
+int main() {
+    int a = 3;
+    if (a) {
+        a = 2;
+    }
+    int t1 = 10;
+    int x = a*a + 1;
+    print("%d %d %d", t1, x, f(a));
+    return 0;
+}
+int f(int L1) {
+    int L2 = L1 + 1;
+    return L2;
+}
+"""
+
+SHADOWING = """\
+int main() {
+    int x = 1;
+    int i = 0;
+    while (i < 2) {
+        int x = i + 10;
+        if (x) {
+            int x = 100;
+            print("%d", x);
+        }
+        print("%d", x);
+        i = i + 1;
+    }
+    print("%d", x);
+    return 0;
+}
+"""
+
+
+def sample_programs():
+    # name -> source: the example programs, edge cases and generated programs
+    programs = {}
+    for path in sorted(glob.glob(os.path.join(ROOT, 'program*.c'))):
+        with open(path) as f:
+            programs[os.path.basename(path)] = f.read()
+    programs['generated_names'] = GENERATED_NAMES
+    programs['shadowing'] = SHADOWING
+    for seed in range(3):
+        programs[f'generated{seed}'] = generate_program(300, seed)
+    return programs
@@ -0,0 +1,123 @@
+import os
+import pickle
+
+import pytest
+
+from cache import CompileCache, load_unit
+from compiler import compile_source
+from programs import sample_programs
+from units import Chunk
+
+PROGRAMS = sample_programs()
+
+
+def chunk(source):
+    return Chunk(1, [source], False)
+
+
+def numbered(number):
+    # Sources of the same size whose entries differ
+    return f'int main() {{\n    print("%d", {number});\n    return 0;\n}}\n'
+
+
+def entry_names(cache):
+    return sorted(os.path.basename(path) for _, _, path in cache.entries())
+
+
+@pytest.mark.parametrize('name', ['program.c', 'generated_names', 'generated0'])
+def test_hit_returns_what_was_compiled(tmp_path, name):
+    cache = CompileCache(str(tmp_path))
+    source = PROGRAMS[name]
+    unit, stats, hit = cache.compile_source(source)
+    assert not hit
+    cached, cached_stats, hit = cache.compile_source(source)
+    assert hit
+    serial = compile_source(source)
+    assert list(cached.code.lines()) == list(serial.intermediate_code.lines())
+    assert cached.tokens == unit.tokens
+    assert [(s.name, s.kind, s.scope, s.uses, s.ir_name) for s in cached.symbols] == \
+        [(s.name, s.kind, s.scope, s.uses, s.ir_name) for s in unit.symbols]
+    assert cached.code.extra == unit.code.extra
+    assert cached_stats['instructions'] == stats['instructions']
+
+
+def test_without_tokens(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    cache.compile_source(PROGRAMS['program.c'])
+    unit, _, hit = cache.compile_source(PROGRAMS['program.c'], with_tokens=False)
+    assert hit and unit.tokens == [] and len(unit.code)
+
+
+@pytest.mark.parametrize('damage', [
+    lambda data: data[:len(data) // 2],
+    lambda data: data[:-1],
+    lambda data: b'',
+    lambda data: b'IRCU' + os.urandom(64),
+    lambda data: pickle.dumps(('not', 'an', 'entry')),
+])
+def test_corrupt_entry_is_discarded_and_recompiled(tmp_path, damage):
+    cache = CompileCache(str(tmp_path))
+    source = chunk(PROGRAMS['program.c'])
+    cache.compile(source)
+    path = cache.path(source)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(damage(data))
+    assert cache.get(source) is None
+    assert not os.path.exists(path)
+    unit, _, hit = cache.compile(source)
+    assert not hit and len(unit.code)
+    assert os.path.exists(path)
+
+
+def test_load_unit_rejects_foreign_data():
+    with pytest.raises(ValueError, match='not a cache entry'):
+        load_unit(pickle.dumps(None) + b'\0' * 8)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    first, second, third = chunk(numbered(1)), chunk(numbered(2)), chunk(numbered(3))
+    cache.compile(first)
+    cache.compile(second)
+    size = os.path.getsize(cache.path(first))
+    os.utime(cache.path(first), (1000, 1000))
+    os.utime(cache.path(second), (2000, 2000))
+    cache.get(first)  # now the most recently used
+    cache.max_bytes = int(size * 2.5)
+    cache.compile(third)
+    assert entry_names(cache) == sorted(os.path.basename(cache.path(c)) for c in (first, third))
+    assert cache.size == cache.disk_usage()
+
+
+def test_lowered_limit_applies_on_first_read(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    for number in range(4):
+        cache.compile(chunk(numbered(number)))
+    small = CompileCache(str(tmp_path), max_bytes=os.path.getsize(cache.path(chunk(numbered(0)))))
+    small.get(chunk(numbered(0)))
+    assert len(small.entries()) <= 1
+
+
+def test_failed_put_leaves_no_partial_entry(tmp_path, monkeypatch):
+    cache = CompileCache(str(tmp_path))
+    source = chunk(PROGRAMS['program.c'])
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, 'replace', fail)
+    unit, _, hit = cache.compile(source)  # the error only costs the cache
+    assert not hit and len(unit.code)
+    assert os.listdir(tmp_path) == []
+    monkeypatch.undo()
+    cache.compile(source)
+    assert os.listdir(tmp_path) == [os.path.basename(cache.path(source))]
+
+
+def test_clear(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    cache.compile(chunk(numbered(1)))
+    cache.clear()
+    assert cache.entries() == [] and cache.size == 0
@@ -0,0 +1,33 @@
+import io
+
+import pytest
+
+from cfg import allocate_temps
+from compiler import compile_source
+from optimizer import optimize
+from programs import sample_programs
+from vm import run_code
+
+PROGRAMS = sample_programs()
+
+
+def run(code):
+    output = io.StringIO()
+    value, _ = run_code(code, output, max_steps=10_000_000)
+    return value, output.getvalue()
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_reuse_temps_keeps_behaviour(name):
+    code = compile_source(PROGRAMS[name]).intermediate_code
+    expected = run(code)
+    reused, _ = allocate_temps(code)
+    both, _ = allocate_temps(optimize(code)[0])
+    assert run(reused) == expected
+    assert run(both) == expected
+
+
+def test_reuse_temps_shrinks_temp_count():
+    code = compile_source(PROGRAMS['generated0']).intermediate_code
+    _, report = allocate_temps(code)
+    assert report.after < report.before
@@ -0,0 +1,33 @@
+import os
+
+import compiler
+from compiler import output_collisions, output_path
+
+
+def test_output_path_keeps_relative_directories():
+    assert output_path(os.path.join('src', 'x.c'), 'out') == os.path.join('out', 'src', 'x.ir')
+    assert output_path(os.path.join('src', 'x.c'), 'out', binary=True) == os.path.join('out', 'src', 'x.irb')
+    assert output_path(os.path.join('src', 'x.c')) == os.path.join('src', 'x.ir')
+
+
+def test_inputs_outside_the_directory_can_collide():
+    a, b = os.path.join(os.pardir, 'a', 'x.c'), os.path.join(os.pardir, 'b', 'x.c')
+    assert output_collisions([a, b], 'out') == {os.path.join('out', 'x.ir'): [a, b]}
+    assert output_collisions([a, b]) == {}
+    assert output_collisions(['x.c', os.path.join('.', 'x.c')], 'out') == \
+        {os.path.join('out', 'x.ir'): ['x.c', os.path.join('.', 'x.c')]}
+
+
+def test_build_refuses_colliding_outputs(tmp_path, monkeypatch, capsys):
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'x.c').write_text('int main() {\n    return 0;\n}\n')
+    work = tmp_path / 'work'
+    work.mkdir()
+    monkeypatch.chdir(work)
+    inputs = [os.path.join(os.pardir, name, 'x.c') for name in ('a', 'b')]
+    assert compiler.main(['build', *inputs, '-o', 'out', '--no-cache']) == 2
+    assert 'would be written by' in capsys.readouterr().err
+    assert not (work / 'out').exists()
+    assert compiler.main(['build', inputs[0], '-o', 'out', '--no-cache']) == 0
+    assert (work / 'out' / 'x.ir').exists()
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import threading
+
+import daemon
+from compiler import compile_source
+from daemon import CompileServer, EVENTS
+from programs import sample_programs
+
+PROGRAMS = sample_programs()
+
+
+def serve(server, client):
+    # Runs client(host, port) against server on a free localhost port
+    async def main():
+        await server.start(port=0)
+        try:
+            return await client(*server.server.sockets[0].getsockname()[:2])
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+async def exchange(host, port, *requests):
+    # Sends the request lines at once and reads replies until each is done
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in requests:
+            writer.write(request if isinstance(request, bytes) else daemon.encode(request))
+        await writer.drain()
+        replies = []
+        while sum(reply['event'] == 'done' for reply in replies) < len(requests):
+            line = await reader.readline()
+            if not line:
+                break
+            replies.append(json.loads(line))
+        return replies
+    finally:
+        writer.close()
+
+
+def compile_message(id, source, **options):
+    return dict({'id': id, 'source': source, 'include': list(EVENTS)}, **options)
+
+
+def test_ping_and_stats():
+    async def client(host, port):
+        return await exchange(host, port, {'id': 1, 'op': 'ping'},
+                              compile_message(2, PROGRAMS['program.c']), {'id': 3, 'op': 'stats'})
+
+    replies = serve(CompileServer(workers=1), client)
+    assert replies[0] == {'id': 1, 'event': 'done', 'ok': True}
+    stats = replies[-1]
+    assert stats['id'] == 3 and stats['ok']
+    assert stats['stats']['requests'] == 3
+    assert stats['stats']['compiled'] == 1
+    assert stats['stats']['pending'] == 0 and stats['stats']['workers'] == 1
+
+
+def test_events_are_chunked_in_order(monkeypatch):
+    monkeypatch.setattr(daemon, 'CHUNK', 5)
+    source = PROGRAMS['program.c']
+
+    async def client(host, port):
+        return await exchange(host, port, compile_message(1, source), compile_message(2, source, optimize=True))
+
+    replies = serve(CompileServer(), client)
+    first = [reply for reply in replies if reply['id'] == 1]
+    assert replies[:len(first)] == first  # requests on a connection are answered in order
+    order = [reply['event'] for reply in first]
+    assert order == sorted(order[:-1], key=EVENTS.index) + ['done']
+    assert order.count('tokens') > 1 and order.count('ir') > 1
+    assert all(len(reply.get('items', ())) <= 5 for reply in first)
+    items = {event: [item for reply in first if reply['event'] == event for item in reply['items']]
+             for event in EVENTS}
+    serial = compile_source(source)
+    assert items['ir'] == list(serial.intermediate_code.lines())
+    assert [row[0] for row in items['symbols']] == [symbol.name for symbol in serial.symbol_table]
+    assert len(items['tokens']) == serial.stats()['tokens']
+    assert items['diagnostics'] == []
+    assert first[-1]['ok'] and first[-1]['stats']['instructions'] == len(serial.intermediate_code)
+    assert replies[-1]['id'] == 2 and replies[-1]['ok']
+
+
+def test_syntax_error_is_a_diagnostic():
+    source = 'int main() {\n    int x y;\n}\n'
+
+    async def client(host, port):
+        return await exchange(host, port, compile_message(1, source))
+
+    replies = serve(CompileServer(), client)
+    assert [reply['event'] for reply in replies] == ['tokens', 'symbols', 'diagnostics', 'done']
+    assert replies[2]['items'][0]['line'] == 2
+    assert not replies[-1]['ok']
+
+
+def test_bad_request_is_answered():
+    async def client(host, port):
+        return await exchange(host, port, b'{not json\n', {'op': 'compile'}, {'id': 7, 'op': 'ping'})
+
+    replies = serve(CompileServer(), client)
+    assert [reply['ok'] for reply in replies] == [False, False, True]
+    assert replies[0]['error'].startswith('bad JSON')
+    assert replies[1]['error'] == "'source' must be a string"
+
+
+def test_busy_when_too_many_compiles_wait(monkeypatch):
+    release = threading.Event()
+    compile_request = daemon.compile_request
+
+    def blocked(parser, request):
+        release.wait(10)
+        return compile_request(parser, request)
+
+    monkeypatch.setattr(daemon, 'compile_request', blocked)
+    server = CompileServer(workers=1, max_pending=1)
+
+    async def client(host, port):
+        held = asyncio.ensure_future(exchange(host, port, compile_message(1, PROGRAMS['program.c'])))
+        while server.pending == 0:
+            await asyncio.sleep(0.01)
+        rejected = await exchange(host, port, compile_message(2, PROGRAMS['program.c']))
+        release.set()
+        return rejected, await held
+
+    rejected, held = serve(server, client)
+    assert rejected == [{'id': 2, 'event': 'done', 'ok': False, 'error': 'busy'}]
+    assert held[-1]['ok']
+    assert server.counters['rejected'] == 1 and server.counters['compiled'] == 1
+
+
+def test_oversized_request_line_is_refused():
+    async def client(host, port):
+        return await exchange(host, port, compile_message(1, 'x' * 5000))
+
+    server = CompileServer(max_request=1024)
+    replies = serve(server, client)
+    assert replies == [{'id': None, 'event': 'done', 'ok': False, 'error': 'request larger than 1024 bytes'}]
+    assert server.counters['requests'] == 0
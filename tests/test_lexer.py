@@ -0,0 +1,75 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from lexer import Lexer
+from programs import ROOT, sample_programs
+
+PROGRAMS = sample_programs()
+ALPHABET = 'intfloawhiercpd_xyz0123456789 \t+-*/=<>!&|%(){},;."#\n'
+
+
+def lex(engine, source):
+    # Token lines, or the error message the engine raises
+    try:
+        return list(Lexer(engine).iter_lines(source))
+    except SyntaxError as e:
+        return str(e)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_engines_agree_on_programs(name):
+    assert lex('table', PROGRAMS[name]) == lex('regex', PROGRAMS[name])
+
+
+def test_engines_agree_on_random_input():
+    rng = random.Random(0)
+    for _ in range(3000):
+        source = ''.join(rng.choice(ALPHABET) for _ in range(rng.randrange(1, 40)))
+        assert lex('table', source) == lex('regex', source), source
+
+
+@pytest.mark.parametrize('source', [
+    'int x1 = 3.14;', 'x = 1.5.2;', '12abc', 'print("%d%s", a);', '%dx', '"open', 'a $ b',
+    'intx = int x', 'café = 1;', '# include <stdio.h>', 'i++; --j;', '', '\n\n  \n',
+])
+def test_engines_agree_on_edge_cases(source):
+    assert lex('table', source) == lex('regex', source)
+
+
+def test_line_numbers_follow_start_line():
+    lines = list(Lexer('table').iter_lines('a = 1;\n\nb = 2;', 10))
+    assert [line for line, _ in lines] == [10, 12]
+    assert lines == list(Lexer('regex').iter_lines('a = 1;\n\nb = 2;', 10))
+
+
+@pytest.mark.parametrize('engine', Lexer.ENGINES)
+def test_tokenize_uses_the_selected_engine(engine, monkeypatch):
+    lexer = Lexer(engine)
+    calls = []
+    iter_tokens = lexer.iter_tokens
+    monkeypatch.setattr(lexer, 'iter_tokens', lambda *args: calls.append(args) or iter_tokens(*args))
+    assert lexer.tokenize('int x=-1;', 4) == [('KEYWORD', 'int'), ('IDENTIFIER', 'x'), ('OPERATOR', '=-'),
+                                              ('NUMBER', '1'), ('DELIMITER', ';')]
+    assert calls == [('int x=-1;', 4)]
+    with pytest.raises(SyntaxError, match='at line 4, column 3'):
+        lexer.tokenize('a $ b', 4)
+
+
+def test_table_engine_starts_without_regex():
+    # With saved tables neither the master regex nor the re module is needed
+    code = ("import sys, lexer, table_lexer\n"
+            "lexer.Lexer('table').tokenize('int main() {')\n"
+            "assert 're' not in sys.modules and lexer.MASTER is None, sorted(sys.modules)\n"
+            "lexer.Lexer('table').tokenize('print(\"café\");')\n"
+            "assert lexer.MASTER is not None\n")
+    with tempfile.TemporaryDirectory() as directory:
+        tables = os.path.join(directory, 'tables.marshal')
+        subprocess.run([sys.executable, '-c', f"import table_lexer; table_lexer.save_tables({tables!r})"],
+                       cwd=ROOT, check=True)
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                       env=dict(os.environ, LEXER_TABLES=tables))
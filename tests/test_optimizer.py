@@ -0,0 +1,31 @@
+import io
+
+import pytest
+
+from compiler import compile_source
+from optimizer import optimize
+from programs import sample_programs
+from vm import run_code
+
+PROGRAMS = sample_programs()
+
+
+def run(code):
+    output = io.StringIO()
+    value, _ = run_code(code, output, max_steps=10_000_000)
+    return value, output.getvalue()
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_optimize_keeps_behaviour(name):
+    code = compile_source(PROGRAMS[name]).intermediate_code
+    optimized, _ = optimize(code)
+    assert run(optimized) == run(code)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_optimize_never_grows_code(name):
+    code = compile_source(PROGRAMS[name]).intermediate_code
+    optimized, _ = optimize(code)
+    assert len(optimized) <= len(code)
+
@@ -0,0 +1,32 @@
+import io
+
+import pytest
+
+from compiler import compile_source
+from vm import run_code
+
+NEGATIVE_INITIALIZERS = """\
+int main() {
+    int x=-1;
+    int y = 5;
+    y=-y;
+    int i;
+    for (i=-2; i < 0; i=-i) {
+        print("%d", i);
+    }
+    print("%d %d %d", x, y, i);
+    return 0;
+}
+"""
+
+
+def test_equals_glued_to_an_operator_is_split():
+    output = io.StringIO()
+    run_code(compile_source(NEGATIVE_INITIALIZERS).intermediate_code, output)
+    assert output.getvalue().split() == ['-2', '-1', '-5', '2']
+
+
+@pytest.mark.parametrize('statement', ['int x y;', 'int x = ;', 'int x 5;', 'int x == 1;'])
+def test_malformed_declaration_is_rejected(statement):
+    with pytest.raises(SyntaxError, match='line 2'):
+        compile_source(f"int main() {{\n    {statement}\n    return 0;\n}}\n")
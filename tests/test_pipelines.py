@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+import compiler
+import parallel
+from compiler import compile_source
+from incremental import IncrementalCompiler
+from parser import Parser
+from programs import sample_programs
+from sinks import BinarySink, MemorySink, load_ir
+
+PROGRAMS = sample_programs()
+
+
+def symbol_rows(symbols):
+    return [(s.name, s.kind, s.type, s.scope, s.line, s.uses, s.ir_name) for s in symbols]
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    monkeypatch.setattr(parallel, 'PARALLEL_MIN_LINES', 0)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_incremental_matches_serial(name):
+    source = PROGRAMS[name]
+    serial = compile_source(source)
+    result = IncrementalCompiler().compile(source)
+    assert list(result.intermediate_code.lines()) == list(serial.intermediate_code.lines())
+    assert symbol_rows(result.symbol_table) == symbol_rows(serial.symbol_table)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_parallel_matches_serial(name, always_parallel):
+    source = PROGRAMS[name]
+    serial = compile_source(source)
+    unit, table, _ = parallel.compile_parallel(source, jobs=2)
+    assert list(unit.code.lines()) == list(serial.intermediate_code.lines())
+    assert symbol_rows(table) == symbol_rows(serial.symbol_table)
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_stream_matches_serial(name):
+    source = PROGRAMS[name]
+    serial = compile_source(source)
+    parser = Parser()
+    sink = MemorySink()
+    parser.parse_stream(io.StringIO(source), sink)
+    assert list(sink.code.lines()) == list(serial.intermediate_code.lines())
+    assert parser.stats()['instructions'] == len(serial.intermediate_code)
+    assert parser.stats()['symbols'] == len(serial.symbol_table)
+
+
+def test_streamed_binary_decodes_to_serial_ir(tmp_path):
+    source = PROGRAMS['generated1']
+    path = str(tmp_path / 'stream.irb')
+    with BinarySink(path) as sink:
+        Parser().parse_stream(io.StringIO(source), sink)
+    assert list(load_ir(path).lines()) == list(compile_source(source).intermediate_code.lines())
+
+
+def test_parallel_output_does_not_depend_on_jobs(always_parallel):
+    source = PROGRAMS['generated0']
+    outputs = {jobs: list(parallel.compile_source(source, jobs)[0].lines()) for jobs in (1, 2, 3)}
+    assert outputs[1] == outputs[2] == outputs[3]
+
+
+def test_generated_names_are_not_renumbered(always_parallel):
+    code = parallel.compile_source(PROGRAMS['generated_names'], 2)[0]
+    lines = list(code.lines())
+    assert 't4 = L1.1 + 1' in lines
+    assert 'L2.1 = t4' in lines
+    assert 't1.1 = 10' in lines
+
+
+def test_stream_stats_count_transformed_code(tmp_path, capsys):
+    source = tmp_path / 'in.c'
+    source.write_text(PROGRAMS['generated0'])
+    output = tmp_path / 'out.ir'
+    assert compiler.main(['stream', str(source), '-O', '-R', '-o', str(output), '--stats']) == 0
+    report = capsys.readouterr().err
+    written = len(output.read_text().splitlines())
+    assert f"\n{written} instructions," in '\n' + report
+    assert '  optimize' in report and '  allocate' in report
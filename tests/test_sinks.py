@@ -0,0 +1,36 @@
+import pytest
+
+from compiler import compile_source
+from programs import sample_programs
+from sinks import BinarySink, MemorySink, decode_ir, encode_ir, load_ir
+
+PROGRAMS = sample_programs()
+
+
+@pytest.mark.parametrize('name', PROGRAMS)
+def test_binary_round_trip(name):
+    code = compile_source(PROGRAMS[name]).intermediate_code
+    decoded = decode_ir(encode_ir(code))
+    assert list(decoded.lines()) == list(code.lines())
+    assert list(decoded) == list(code)
+
+
+def test_binary_sink_blocks_concatenate(tmp_path):
+    first = compile_source(PROGRAMS['program.c']).intermediate_code
+    second = compile_source(PROGRAMS['generated0']).intermediate_code
+    path = str(tmp_path / 'out.irb')
+    with BinarySink(path) as sink:
+        sink.write(first)
+        sink.write(second)
+    expected = MemorySink()
+    expected.write(first)
+    expected.write(second)
+    assert list(load_ir(path).lines()) == list(expected.code.lines())
+
+
+def test_truncated_binary_is_rejected():
+    data = encode_ir(compile_source(PROGRAMS['program.c']).intermediate_code)
+    with pytest.raises(ValueError, match='truncated'):
+        decode_ir(data[:-3])
+    with pytest.raises(ValueError, match='not a binary IR file'):
+        decode_ir(b'nope' + data[4:])
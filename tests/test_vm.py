@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+from compiler import compile_source
+from optimizer import optimize
+from programs import GENERATED_NAMES, SHADOWING
+from vm import VMError, run_code
+
+RECURSIVE_SUM = """\
+int main() {
+    print("%d", sum(N));
+    return 0;
+}
+int sum(int n) {
+    if (n == 0) {
+        return 0;
+    }
+    return n + sum(n - 1);
+}
+"""
+
+
+def run(source, **options):
+    output = io.StringIO()
+    value, _ = run_code(compile_source(source).intermediate_code, output, **options)
+    return value, output.getvalue().split()
+
+
+def test_names_spelled_like_temps_keep_their_values():
+    assert run(GENERATED_NAMES)[1] == ['10', '5', '3']
+
+
+def test_shadowed_variable_is_restored_after_block():
+    assert run(SHADOWING)[1] == ['100', '10', '100', '11', '1']
+
+
+def test_deep_recursion_is_limited_by_memory_only():
+    assert run(RECURSIVE_SUM.replace('N', '50000'))[1] == [str(50000 * 50001 // 2)]
+
+
+def test_max_depth():
+    with pytest.raises(VMError, match='call depth exceeded 100'):
+        run(RECURSIVE_SUM.replace('N', '200'), max_depth=100)
+
+
+def test_max_steps():
+    source = "int main() {\n    while (1) {\n        print(\"x\");\n    }\n}\n"
+    with pytest.raises(VMError, match='step limit'):
+        run(source, max_steps=1000)
+
+
+def test_division_truncates_toward_zero():
+    source = 'int main() {\n    print("%d %d", 0 - 7 / 2, (0 - 7) % 2);\n    return 0;\n}\n'
+    assert run(source)[1] == ['-3', '-1']
+
+
+def test_max_steps_after_jump_threading():
+    # -O turns the loop into 'L: if not x goto L', a conditional back edge
+    source = "int main() {\n    int x = 0;\n    while (1) {\n        if (x) {\n            x = 1;\n        }\n    }\n}\n"
+    code = optimize(compile_source(source).intermediate_code)[0]
+    with pytest.raises(VMError, match='step limit'):
+        run_code(code, io.StringIO(), max_steps=1000)
+
+
+def test_names_float_accepts_are_variables():
+    source = 'int main() {\n    int inf;\n    int nan = 2;\n    print("%d %d", inf, nan);\n    return 0;\n}\n'
+    assert run(source)[1] == ['0', '2']
+
+
+def test_printing_infinity_as_int_is_a_vm_error():
+    source = """\
+int main() {
+    float x = 10.0;
+    int i = 0;
+    while (i < 10) {
+        x = x * x;
+        i = i + 1;
+    }
+    print("%d", x);
+    return 0;
+}
+"""
+    with pytest.raises(VMError, match='cannot print'):
+        run(source)
@@ -0,0 +1,101 @@
+import hashlib
+import re
+
+from ir import IRBuffer
+from parser import Parser
+
+# A translation unit is split into top-level chunks: each function (from its
+# `int name(...) {` header to the matching `}`) and the runs of lines between
+# them. Chunks are compiled with their own temp/label numbering and merged
+# back in source order with the numbering shifted, which gives the same
+# output as compiling the whole buffer at once.
+
+STRING_LITERAL = re.compile(r'".*?"')
+
+
+class Chunk:
+    __slots__ = ('start_line', 'text', 'is_function', 'key')
+
+    def __init__(self, start_line, lines, is_function):
+        self.start_line = start_line
+        self.text = '\n'.join(lines)
+        self.is_function = is_function
+        self.key = hashlib.blake2b(self.text.encode(), digest_size=16).digest()
+
+
+class CompiledUnit:
+    __slots__ = ('start_line', 'tokens', 'symbols', 'forward', 'code', 'temps', 'labels', 'main_found')
+
+    def __init__(self, start_line, tokens, symbols, forward, code, temps, labels, main_found):
+        self.start_line = start_line
+        self.tokens = tokens
+        self.symbols = symbols
+        self.forward = forward
+        self.code = code
+        self.temps = temps
+        self.labels = labels
+        self.main_found = main_found
+
+
+def brace_delta(line):
+    if '{' not in line and '}' not in line:
+        return 0
+    if line.startswith('#'):
+        return 0
+    if '"' in line:
+        line = STRING_LITERAL.sub('', line)
+    return line.count('{') - line.count('}')
+
+
+def split_units(source):
+    chunks = []
+    lines = []
+    start_line = 1
+    depth = 0
+    for line_number, line in enumerate(source.split('\n'), 1):
+        delta = brace_delta(line.strip())
+        if depth == 0 and delta > 0:
+            # A function header opens a new chunk
+            if lines:
+                chunks.append(Chunk(start_line, lines, False))
+            lines = []
+            start_line = line_number
+        lines.append(line)
+        depth += delta
+        if depth <= 0 and delta < 0:
+            chunks.append(Chunk(start_line, lines, True))
+            lines = []
+            start_line = line_number + 1
+            depth = 0
+    if lines:
+        chunks.append(Chunk(start_line, lines, depth > 0))
+    return chunks
+
+
+def compile_unit(chunk, parser=None):
+    parser = parser or Parser()
+    parser.reset()
+    tokens = []
+    parser.parse_lines(parser.lexer.iter_lines(chunk.text, chunk.start_line), tokens)
+    table = parser.symbol_table
+    return CompiledUnit(chunk.start_line, tokens, table.symbols, table.forward,
+                        parser.intermediate_code, parser.temp_count, parser.label_count,
+                        parser.main_found)
+
+
+def merge_code(units):
+    # Concatenates unit IR in order, shifting each unit's t<n>/L<n> numbering
+    code = IRBuffer()
+    temp_offset = 0
+    label_offset = 0
+    for unit in units:
+        code.extend(unit.code, temp_offset, label_offset)
+        temp_offset += unit.temps
+        label_offset += unit.labels
+    return code
+
+
+def shift_tokens(tokens, delta):
+    if not delta:
+        return tokens
+    return [token._replace(line=token.line + delta) for token in tokens]
@@ -0,0 +1,364 @@
+import sys
+import time
+
+from ir import CALL, COPY, FUNC, GOTO, IF, IFNOT, LABEL, OPCODE, OPCODES, PRINT, RETURN
+
+# Executes intermediate code. link() turns an IRBuffer into one Function per
+# `func`: labels become instruction indices, call targets become Function
+# objects and every operand (parameters, locals, temps and constants) gets a
+# slot in a flat frame list. A call copies the function's frame template,
+# whose constant slots are pre-filled and the rest are 0, so the dispatch
+# loop only ever indexes lists.
+#
+# Linked instructions are (op, a, b, r, x) tuples of slot numbers, where x
+# is the operator function for arithmetic, (callee, argument slots) for
+# calls and the argument slots for print.
+
+BINARY_OP = len(OPCODES)  # linked opcode shared by binary and unary operators
+
+
+class VMError(RuntimeError):
+    pass
+
+
+def c_divide(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        # C division truncates toward zero
+        quotient = abs(a) // abs(b)
+        return -quotient if (a < 0) != (b < 0) else quotient
+    return a / b
+
+
+def c_modulo(a, b):
+    return a - b * c_divide(a, b)
+
+
+OPERATORS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': c_divide,
+    '%': c_modulo,
+    '<': lambda a, b: 1 if a < b else 0,
+    '>': lambda a, b: 1 if a > b else 0,
+    '<=': lambda a, b: 1 if a <= b else 0,
+    '>=': lambda a, b: 1 if a >= b else 0,
+    '==': lambda a, b: 1 if a == b else 0,
+    '!=': lambda a, b: 1 if a != b else 0,
+    '&&': lambda a, b: 1 if a and b else 0,
+    '||': lambda a, b: 1 if a or b else 0,
+    'neg': lambda a, b: -a,
+    'not': lambda a, b: 0 if a else 1,
+}
+OPERATOR_BY_CODE = {OPCODE[name]: function for name, function in OPERATORS.items()}
+OPERATOR_NAME = {function: name for name, function in OPERATORS.items()}
+
+
+def constant_value(name):
+    # Literal operands: integers, decimals and string literals. Anything else
+    # is a variable, including names such as 'inf' or 'nan' that float()
+    # would accept
+    if name[:1] == '"':
+        return name[1:-1]
+    if not (name[:1].isdigit() or (name[:1] == '-' and name[1:2].isdigit())):
+        return None
+    try:
+        return int(name)
+    except ValueError:
+        pass
+    try:
+        return float(name)
+    except ValueError:
+        return None
+
+
+class Function:
+    __slots__ = ('name', 'params', 'code', 'template', 'slot_names', 'start', 'counts')
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start       # index of the func instruction in the IR
+        self.params = ()         # slots receiving the arguments
+        self.code = []
+        self.template = []       # initial frame
+        self.slot_names = []
+        self.counts = None       # executions per instruction while profiling
+
+    def __repr__(self):
+        return f"Function({self.name!r}, {len(self.params)} params, {len(self.code)} instructions)"
+
+
+class Program:
+    def __init__(self, functions):
+        self.functions = functions  # name -> Function
+
+    def __getitem__(self, name):
+        return self.functions[name]
+
+
+def link(code):
+    functions = {}
+    bodies = []
+    current = None
+    for index, op in enumerate(code.ops):
+        if op == FUNC:
+            name = code.operand(code.result[index])
+            if name in functions:
+                raise VMError(f"function '{name}' defined twice")
+            current = Function(name, index)
+            functions[name] = current
+            bodies.append((current, []))
+        elif current is None:
+            raise VMError(f"instruction {index} is outside any function")
+        bodies[-1][1].append(index)
+
+    for function, indices in bodies:
+        link_function(code, function, indices, functions)
+    return Program(functions)
+
+
+def link_function(code, function, indices, functions):
+    slots = {}
+    template = function.template
+    names = function.slot_names
+    operand = code.operand
+
+    def slot(operand_id):
+        if operand_id == -1:
+            return -1
+        number = slots.get(operand_id)
+        if number is None:
+            name = operand(operand_id)
+            value = constant_value(name) if operand_id >= 0 else None
+            number = slots[operand_id] = len(template)
+            template.append(0 if value is None else value)
+            names.append(name)
+        return number
+
+    # Labels resolve to the index of the next real instruction
+    labels = {}
+    position = 0
+    for index in indices[1:]:
+        if code.ops[index] == LABEL:
+            labels[code.result[index]] = position
+        else:
+            position += 1
+
+    def target(operand_id):
+        return labels[operand_id] if operand_id in labels else missing_label(operand(operand_id))
+
+    def missing_label(name):
+        raise VMError(f"jump to undefined label '{name}' in {function.name}")
+
+    first = indices[0]
+    function.params = tuple(slot(i) for i in code.extra.get(first, ()))
+    linked = function.code
+    for index in indices[1:]:
+        op = code.ops[index]
+        a, b, r = code.arg1[index], code.arg2[index], code.result[index]
+        if op == LABEL:
+            continue
+        if op == COPY:
+            linked.append((COPY, slot(a), -1, slot(r), None))
+        elif op in OPERATOR_BY_CODE:
+            linked.append((BINARY_OP, slot(a), slot(b), slot(r), OPERATOR_BY_CODE[op]))
+        elif op == GOTO:
+            linked.append((GOTO, -1, -1, target(r), None))
+        elif op in (IF, IFNOT):
+            linked.append((op, slot(a), -1, target(r), None))
+        elif op == CALL:
+            name = operand(a)
+            callee = functions.get(name)
+            if callee is None:
+                raise VMError(f"call to undefined function '{name}' in {function.name}")
+            args = tuple(slot(i) for i in code.extra.get(index, ()))
+            linked.append((CALL, -1, -1, slot(r), (callee, args)))
+        elif op == PRINT:
+            linked.append((PRINT, -1, -1, -1, tuple(slot(i) for i in code.extra.get(index, ()))))
+        elif op == RETURN:
+            linked.append((RETURN, slot(a), -1, -1, None))
+        else:
+            raise VMError(f"unexpected '{OPCODES[op]}' in {function.name}")
+    # Falling off the end returns 0
+    linked.append((RETURN, -1, -1, -1, None))
+
+
+def format_print(values):
+    # print("fmt %d", x) formats like printf; otherwise values are joined
+    if values and isinstance(values[0], str) and '%' in values[0] and len(values) > 1:
+        try:
+            return values[0] % tuple(values[1:])
+        except (TypeError, ValueError):
+            pass
+        except OverflowError as e:
+            raise VMError(f"cannot print {values[0]!r}: {e}") from None
+    return ' '.join(str(value) for value in values)
+
+
+class Profile:
+    def __init__(self):
+        self.calls = {}     # function name -> calls
+        self.seconds = {}   # function name -> inclusive seconds
+        self.active = {}    # function name -> activations on the stack
+        self.started = {}   # function name -> start of its outermost activation
+        self.steps = 0
+        self.elapsed = 0.0
+
+    def enter(self, name):
+        # Time is only taken for the outermost activation so that recursion
+        # is not counted twice
+        self.calls[name] = self.calls.get(name, 0) + 1
+        active = self.active.get(name, 0)
+        if not active:
+            self.started[name] = time.perf_counter()
+        self.active[name] = active + 1
+
+    def leave(self, name):
+        active = self.active[name] - 1
+        self.active[name] = active
+        if not active:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - self.started[name]
+
+    def report(self, program, top=20):
+        lines = [f"{self.steps} instructions in {self.elapsed * 1000:.2f} ms"
+                 + (f" ({self.steps / self.elapsed:,.0f}/s)" if self.elapsed else "")]
+        by_op = {}
+        for function in program.functions.values():
+            if function.counts is None:
+                continue
+            for instr, count in zip(function.code, function.counts):
+                name = OPERATOR_NAME[instr[4]] if instr[0] == BINARY_OP else OPCODES[instr[0]]
+                by_op[name] = by_op.get(name, 0) + count
+        lines.append("  by instruction:")
+        for name, count in sorted(by_op.items(), key=lambda item: -item[1]):
+            lines.append(f"    {name:<10}{count:>12}")
+        lines.append("  by function (calls, inclusive ms):")
+        ranked = sorted(self.calls.items(), key=lambda item: -self.seconds.get(item[0], 0.0))
+        if len(ranked) > top:
+            lines.append(f"    ({len(ranked) - top} more not shown)")
+        for name, calls in ranked[:top]:
+            lines.append(f"    {name:<16}{calls:>10}{self.seconds.get(name, 0.0) * 1000:12.2f}")
+        return '\n'.join(lines)
+
+
+class VM:
+    def __init__(self, program, output=None, max_steps=None, max_depth=None, profile=False):
+        # max_depth limits nested calls; by default only memory does
+        self.program = program
+        self.output = sys.stdout if output is None else output
+        self.max_steps = max_steps if max_steps is not None else float('inf')
+        self.max_depth = max_depth if max_depth is not None else float('inf')
+        self.depth = 0
+        self.steps = 0
+        self.profile = Profile() if profile else None
+        for function in program.functions.values():
+            function.counts = [0] * len(function.code) if profile else None
+
+    def run(self, entry='main', args=()):
+        function = self.program.functions.get(entry)
+        if function is None:
+            raise VMError(f"no function named '{entry}'")
+        start = time.perf_counter()
+        try:
+            return self.call(function, args)
+        finally:
+            if self.profile is not None:
+                self.profile.steps = self.steps
+                self.profile.elapsed = time.perf_counter() - start
+
+    def call(self, function, args):
+        if len(args) != len(function.params):
+            raise VMError(f"{function.name} expects {len(function.params)} arguments, got {len(args)}")
+        return self.execute(function, args)
+
+    def execute(self, function, args):
+        # Calls do not recurse in Python: the caller's (function, frame,
+        # return pc, result slot) is pushed on an explicit stack, so call
+        # depth is limited by memory (or max_depth) only. The step limit is
+        # checked on every taken jump and call, since any of them can close
+        # a loop once -O has threaded jumps
+        profile = self.profile
+        if profile is not None:
+            profile.enter(function.name)
+        f = function.template[:]
+        for slot, value in zip(function.params, args):
+            f[slot] = value
+        code = function.code
+        counts = function.counts
+        stack = []
+        limit = self.max_steps
+        max_depth = self.max_depth
+        pc = 0
+        steps = 0
+        try:
+            while True:
+                op, a, b, r, x = code[pc]
+                if counts is not None:
+                    counts[pc] += 1
+                pc += 1
+                steps += 1
+                if op == BINARY_OP:
+                    f[r] = x(f[a], f[b])
+                elif op == COPY:
+                    f[r] = f[a]
+                elif op == IFNOT:
+                    if not f[a]:
+                        pc = r
+                        if self.steps + steps > limit:
+                            raise VMError(f"step limit of {self.max_steps} exceeded in {function.name}")
+                elif op == GOTO:
+                    pc = r
+                    if self.steps + steps > limit:
+                        raise VMError(f"step limit of {self.max_steps} exceeded in {function.name}")
+                elif op == IF:
+                    if f[a]:
+                        pc = r
+                        if self.steps + steps > limit:
+                            raise VMError(f"step limit of {self.max_steps} exceeded in {function.name}")
+                elif op == CALL:
+                    callee, arg_slots = x
+                    if len(arg_slots) != len(callee.params):
+                        raise VMError(f"{callee.name} expects {len(callee.params)} arguments, "
+                                      f"got {len(arg_slots)}")
+                    if len(stack) + 1 >= max_depth:
+                        raise VMError(f"call depth exceeded {self.max_depth} in {callee.name}")
+                    if self.steps + steps > limit:
+                        raise VMError(f"step limit of {self.max_steps} exceeded in {function.name}")
+                    frame = callee.template[:]
+                    for slot, i in zip(callee.params, arg_slots):
+                        frame[slot] = f[i]
+                    stack.append((function, f, pc, r))
+                    self.depth = len(stack)
+                    if profile is not None:
+                        profile.enter(callee.name)
+                    function = callee
+                    f = frame
+                    code = callee.code
+                    counts = callee.counts
+                    pc = 0
+                elif op == PRINT:
+                    self.output.write(format_print([f[i] for i in x]) + '\n')
+                else:
+                    value = 0 if a == -1 else f[a]
+                    if profile is not None:
+                        profile.leave(function.name)
+                    if not stack:
+                        return value
+                    function, f, pc, r = stack.pop()
+                    self.depth = len(stack)
+                    code = function.code
+                    counts = function.counts
+                    f[r] = value
+        except ZeroDivisionError:
+            raise VMError(f"division by zero in {function.name}") from None
+        except TypeError:
+            raise VMError(f"bad operand types in {function.name}: {code[pc - 1]!r}") from None
+        finally:
+            self.steps += steps
+            self.depth = 0
+
+
+def run_code(code, output=None, max_steps=None, profile=False, max_depth=None):
+    # Links and runs main; returns (exit value, VM)
+    vm = VM(link(code), output, max_steps, max_depth, profile=profile)
+    return vm.run(), vm